@@ -0,0 +1,49 @@
+# app/bot/dispatcher.py
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+
+from app.bot.handlers import start as start_pkg, callbacks as cb_pkg, lang_cmd as lang_pkg, broadcast as broadcast_pkg
+from app.core.config import conf
+from app.core.logger import get_logger
+from app.core.tracing import TraceUpdateMiddleware, traced, tracer
+from app.middlewares.db_middleware import DBSessionMiddleware
+from app.middlewares.dedup_middleware import UpdateDedupMiddleware
+from app.middlewares.fsm_prefetch_middleware import FSMPrefetchMiddleware
+from app.middlewares.metrics_middleware import UpdateMetricsMiddleware, HandlerMetricsMiddleware
+from app.middlewares.middleware import ChatLoggerMiddleware
+from app.middlewares.request_id_middleware import RequestIDMiddleware
+from app.utils.fsm_storage import RedisFSMStorage
+from app.utils.telegram_session import RateLimitedSession
+
+logger = get_logger()
+
+
+def create_bot() -> Bot:
+    return Bot(
+        token=conf.bot.token,
+        session=RateLimitedSession(),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+
+
+def create_dispatcher() -> Dispatcher:
+    dp = Dispatcher(storage=RedisFSMStorage())
+    # first of ours: it has to run even for updates the dedup drops
+    dp.update.outer_middleware(FSMPrefetchMiddleware())
+    if tracer.enabled:
+        dp.update.outer_middleware(TraceUpdateMiddleware())
+    if conf.bot.update_dedup:
+        # ahead of the rest, so a duplicate touches neither the DB nor the Bot API nor the update metrics
+        dp.update.outer_middleware(traced(UpdateDedupMiddleware()))
+    dp.update.outer_middleware(traced(UpdateMetricsMiddleware()))
+    dp.update.outer_middleware(traced(RequestIDMiddleware()))
+    dp.update.outer_middleware(traced(DBSessionMiddleware()))
+    dp.update.outer_middleware(traced(ChatLoggerMiddleware(logger=logger)))
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+    dp.include_router(broadcast_pkg.router)
+    dp.include_router(start_pkg.router)
+    dp.include_router(cb_pkg.router)
+    dp.include_router(lang_pkg.router)
+    return dp
@@ -0,0 +1,46 @@
+# app/bot/handlers/broadcast.py
+from aiogram import Bot, F, Router
+from aiogram.filters.command import Command, CommandObject
+from aiogram.types import Message
+
+from app.bot.kb.translations import catalog
+from app.core.config import conf
+from app.core.logger import get_logger
+from app.utils.broadcast import BroadcastUnavailable, broadcaster
+
+router = Router()
+router.message.filter(F.from_user.id == conf.admin)
+
+
+# /broadcast <translation key> | /broadcast status | /broadcast stop
+@router.message(Command("broadcast"))
+async def broadcast_command(message: Message, command: CommandObject, bot: Bot, **data):
+    arg = (command.args or "").strip()
+    if not arg:
+        return await message.answer("Usage: /broadcast &lt;text key&gt; | status | stop")
+    try:
+        return await _broadcast(message, bot, arg, get_logger(data.get("request_id")))
+    except BroadcastUnavailable:
+        return await message.answer("Broadcasts are unavailable: Redis is not connected.")
+
+
+async def _broadcast(message: Message, bot: Bot, arg: str, logger):
+    if arg == "status":
+        state = await broadcaster.status()
+        if state is None:
+            return await message.answer("No active broadcast.")
+        return await message.answer(
+            f"Broadcast {state['id']} ({state['key']}): {state['status']}, sent {state['sent']}, "
+            f"blocked {state['blocked']}, failed {state['failed']}, last id {state['last_id']}"
+        )
+    if arg == "stop":
+        broadcast_id = await broadcaster.cancel()
+        return await message.answer(f"Broadcast {broadcast_id} stopping." if broadcast_id else "No active broadcast.")
+    if not catalog.has(arg):
+        return await message.answer(f"Unknown text key: {arg}")
+    try:
+        broadcast_id = await broadcaster.start(bot, arg, message.chat.id)
+    except RuntimeError:
+        return await message.answer("Another broadcast is running, see /broadcast status.")
+    logger.info("broadcast_requested", id=broadcast_id, key=arg, admin=message.from_user.id)
+    return await message.answer(f"Broadcast {broadcast_id} started.")
@@ -4,10 +4,10 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery
 
 from app.bot.kb.states import LanguageSelection
-from app.bot.kb.translations import t
+from app.bot.kb.translations import catalog, t
 from app.core.logger import get_logger
 from app.utils.redis_manager import RedisManager
-from app.utils.user_service import upsert_user_language
+from app.utils.user_service import upsert_user_language, cache_set_lang
 
 router = Router()
 
@@ -20,12 +20,14 @@ async def lang_callback(call: CallbackQuery, state: FSMContext, **data):
     redis = RedisManager.client()
     lang = call.data.split(":", 1)[1].strip()
     tg_id = call.from_user.id
+    if lang not in catalog.languages:
+        return await call.answer()
     try:
         user_id = await upsert_user_language(session=db, chat_id=tg_id, language=lang)
         if getattr(db, "session_created", False):
             db.info["committed_by_handler"] = True
             await db.commit()
-        logger.info("lang_callback: upserted id=%s chat_id=%s lang=%s", user_id, tg_id, lang)
+        logger.info("lang_callback_upserted", user_id=user_id, chat_id=tg_id, lang=lang)
     except Exception:
         try:
             if getattr(db, "session_created", False):
@@ -34,11 +36,7 @@ async def lang_callback(call: CallbackQuery, state: FSMContext, **data):
             logger.exception("rollback failed")
         await call.answer("Server error, try again later.", show_alert=True)
         return await state.clear()
-    try:
-        if redis:
-            await redis.set(f"user:{tg_id}:lang", lang, ex=7 * 24 * 3600)
-    except Exception:
-        logger.warning("redis set failed for %s", tg_id)
+    await cache_set_lang(redis, tg_id, lang)
 
     await call.answer(t(lang, "lang_set"))
     try:
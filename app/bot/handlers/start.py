@@ -8,8 +8,12 @@ from app.bot.kb.keyboards import language_keyboard
 from app.bot.kb.states import LanguageSelection
 from app.bot.kb.translations import t
 from app.core.logger import get_logger
+from app.utils.profile_writer import profile_buffer
 from app.utils.redis_manager import RedisManager
-from app.utils.user_service import get_lang_cache_then_db, ensure_user_exists
+from app.utils.user_service import (
+    NO_LANG, cache_lang, cache_negative, cache_profile, get_cached_profile, profile_fingerprint,
+    refresh_profile_fingerprint, upsert_user,
+)
 
 router = Router()
 
@@ -25,11 +29,22 @@ async def start_handler(message: Message, state: FSMContext, **data):
     is_premium = getattr(message.from_user, "is_premium", False)
     await state.clear()
     redis = RedisManager.client()
-    lang = await get_lang_cache_then_db(session=db, redis_client=redis, chat_id=tg_id)
-    if lang:
-        return await message.answer(t(lang, "greeting"))
+    fingerprint = profile_fingerprint(username, first_name, is_premium)
+    profile = await get_cached_profile(redis_client=redis, chat_id=tg_id)
+    if profile is not None:
+        # returning user: no DB access unless username/first_name/is_premium changed
+        user_id, lang, cached_fingerprint = profile
+        if cached_fingerprint != fingerprint:
+            # the cache keeps the old fingerprint until the row is written, so a lost or
+            # failing flush is retried by the next /start instead of hidden for CACHE_TTL
+            profile_buffer.add(tg_id, username, first_name, is_premium,
+                               on_flushed=lambda: refresh_profile_fingerprint(redis, tg_id, fingerprint))
+        if lang:
+            return await message.answer(t(lang, "greeting"))
+        await message.answer(t("en", "welcome"), reply_markup=language_keyboard())
+        return await state.set_state(LanguageSelection.select_language)
     try:
-        user_id = await ensure_user_exists(
+        user_id, lang = await upsert_user(
             session=db,
             chat_id=tg_id,
             username=username,
@@ -40,14 +55,19 @@ async def start_handler(message: Message, state: FSMContext, **data):
         if getattr(db, "session_created", False):
             db.info["committed_by_handler"] = True
             await db.commit()
-        logger.info("start: ensured user id=%s chat_id=%s", user_id, tg_id)
+        logger.info("start_user_upserted", user_id=user_id, chat_id=tg_id)
     except Exception:
-        logger.exception("start: ensure_user failed")
+        logger.exception("start: upsert_user failed")
         try:
             if getattr(db, "session_created", False):
                 await db.rollback()
         except Exception:
             logger.exception("start: rollback failed")
         return await message.answer("Server error, try again later.")
+    await cache_profile(redis, tg_id, user_id, lang, fingerprint)
+    if lang:
+        await cache_lang(redis, tg_id, lang)
+        return await message.answer(t(lang, "greeting"))
+    await cache_negative(redis, tg_id, NO_LANG)
     await message.answer(t("en", "welcome"), reply_markup=language_keyboard())
     return await state.set_state(LanguageSelection.select_language)
@@ -1,16 +1,24 @@
 # app/bot/keyboards.py
+from functools import lru_cache
 
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from app.bot.kb.translations import catalog
 
-def language_keyboard():
-    kb = InlineKeyboardMarkup(
+
+# Markups are static, so each is built once per catalog version and shared between updates.
+# Callers must not mutate the returned objects.
+def language_keyboard() -> InlineKeyboardMarkup:
+    return _language_keyboard(catalog.version)
+
+
+@lru_cache(maxsize=4)
+def _language_keyboard(version: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="🇺🇿 Uzbek", callback_data="lang:uz"),
-                InlineKeyboardButton(text="🇷🇺 Русский", callback_data="lang:ru"),
-                InlineKeyboardButton(text="🇬🇧 English", callback_data="lang:en"),
+                InlineKeyboardButton(text=catalog.names[lang], callback_data=f"lang:{lang}")
+                for lang in catalog.languages
             ]
         ]
     )
-    return kb
@@ -1,10 +1,103 @@
 # app/bot/translations.py
-langs_text = {
-    "en": {"welcome": "Choose language", "greeting": "Welcome back!", "lang_set": "Language set"},
-    "uz": {"welcome": "Tilni tanlang", "greeting": "Xush kelibsiz!", "lang_set": "Til saqlandi"},
-    "ru": {"welcome": "Выберите язык", "greeting": "Добро пожаловать!", "lang_set": "Язык сохранён"},
-}
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+
+from app.core.config import conf
+from app.core.logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_LANG = "en"
+LOCALES_DIR = Path(__file__).parent / "locales"
+
+
+# Texts live in locales/<lang>.json; the optional "_meta" entry holds the button label
+# ("name"), the position in the language keyboard ("order") and the language to fall
+# back to for missing keys ("fallback", default "en"). Fallback chains are resolved at
+# load time, so t() is two dict lookups. Reloading swaps the whole catalog at once and
+# bumps `version`, which keyed caches (keyboards) use to rebuild.
+class Catalog:
+    def __init__(self, path: Path):
+        self.path = path
+        self.version = 0
+        self.languages: Tuple[str, ...] = ()
+        self.names: Dict[str, str] = {}
+        self._texts: Dict[str, Dict[str, str]] = {}
+        self._default: Dict[str, str] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def t(self, lang: Optional[str], key: str) -> str:
+        return self._texts.get(lang, self._default).get(key, "")
+
+    def has(self, key: str) -> bool:
+        return key in self._default
+
+    def load(self) -> None:
+        raw: Dict[str, dict] = {}
+        mtimes = self._scan()
+        for file in sorted(self.path.glob("*.json")):
+            raw[file.stem] = orjson.loads(file.read_bytes())
+        if DEFAULT_LANG not in raw:
+            raise RuntimeError(f"{self.path}: missing {DEFAULT_LANG}.json")
+        texts = {lang: self._resolve(raw, lang) for lang in raw}
+        meta = {lang: raw[lang].get("_meta", {}) for lang in raw}
+        self.languages = tuple(sorted(raw, key=lambda lang: (meta[lang].get("order", 100), lang)))
+        self.names = {lang: meta[lang].get("name", lang) for lang in raw}
+        self._texts = texts
+        self._default = texts[DEFAULT_LANG]
+        self._mtimes = mtimes
+        self.version += 1
+        logger.info("translations_loaded", languages=list(self.languages), keys=len(self._default))
+
+    def _resolve(self, raw: Dict[str, dict], lang: str) -> Dict[str, str]:
+        chain: List[str] = []
+        cur: Optional[str] = lang
+        while cur is not None and cur not in chain and cur in raw:
+            chain.append(cur)
+            cur = raw[cur].get("_meta", {}).get("fallback", DEFAULT_LANG if cur != DEFAULT_LANG else None)
+        merged: Dict[str, str] = {}
+        for name in reversed(chain):
+            merged.update((k, v) for k, v in raw[name].items() if k != "_meta")
+        return merged
+
+    def _scan(self) -> Dict[str, float]:
+        return {f.name: f.stat().st_mtime for f in self.path.glob("*.json")}
+
+    async def start(self) -> None:
+        # LOCALES_RELOAD > 0: poll the files and reload on change (edit texts without a restart)
+        if conf.bot.locales_reload > 0 and self._task is None:
+            self._task = asyncio.create_task(self._watch(conf.bot.locales_reload))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            current = self._mtimes
+            try:
+                current = self._scan()
+                if current != self._mtimes:
+                    self.load()
+            except Exception:
+                # keep serving the previous catalog until the files change again
+                self._mtimes = current
+                logger.exception("translations_reload_failed")
+
+
+catalog = Catalog(Path(conf.bot.locales_dir) if conf.bot.locales_dir else LOCALES_DIR)
+catalog.load()
 
 
 def t(lang: str, key: str) -> str:
-    return langs_text.get(lang, langs_text["en"]).get(key, "")
+    return catalog.t(lang, key)
@@ -3,8 +3,8 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass, field
-from typing import Optional
-from urllib.parse import quote_plus
+from typing import List, Optional
+from urllib.parse import quote_plus, urlparse
 
 from dotenv import load_dotenv
 from sqlalchemy.engine import URL
@@ -45,6 +45,29 @@ class DBConf:
     pool_min: int = field(default_factory=lambda: _getint("DB_POOL_MIN", 5))
     pool_max: int = field(default_factory=lambda: _getint("DB_POOL_MAX", 20))
     use_pgbouncer: bool = field(default_factory=lambda: _getbool("USE_PGBOUNCER", False))
+    # seconds: wait for a pooled connection / open a new one / run one statement
+    pool_timeout: float = field(default_factory=lambda: float(_getenv("DB_POOL_TIMEOUT", "2")))
+    connect_timeout: float = field(default_factory=lambda: float(_getenv("DB_CONNECT_TIMEOUT", "3")))
+    command_timeout: float = field(default_factory=lambda: float(_getenv("DB_COMMAND_TIMEOUT", "5")))
+    profile_flush_size: int = field(default_factory=lambda: _getint("PROFILE_FLUSH_SIZE", 500))
+    profile_flush_interval: int = field(default_factory=lambda: _getint("PROFILE_FLUSH_INTERVAL", 5))
+    # bounds while Postgres fails: chats waiting to be written, failed flushes a row survives
+    profile_max_pending: int = field(default_factory=lambda: _getint("PROFILE_MAX_PENDING", 50_000))
+    profile_max_retries: int = field(default_factory=lambda: _getint("PROFILE_MAX_RETRIES", 5))
+    schema_check: str = field(default_factory=lambda: _getenv("DB_SCHEMA_CHECK", "revision"))  # revision|create_all|off
+    require_head: bool = field(default_factory=lambda: _getbool("DB_REQUIRE_HEAD", False))
+    # read replicas (comma separated URLs); reads go to the primary when a replica lags more than max_lag seconds
+    replica_urls: List[str] = field(default_factory=lambda: [
+        u.strip() for u in (_getenv("DB_REPLICA_URLS") or "").split(",") if u.strip()
+    ])
+    replica_max_lag: float = field(default_factory=lambda: float(_getenv("DB_REPLICA_MAX_LAG", "5")))
+    replica_check_interval: float = field(default_factory=lambda: float(_getenv("DB_REPLICA_CHECK_INTERVAL", "5")))
+    # statement profiler: slow-query log threshold (ms), statements one update may run before a
+    # warning (0 = no limit), distinct statement fingerprints aggregated for /debug/sql
+    sql_profile: bool = field(default_factory=lambda: _getbool("SQL_PROFILE", True))
+    sql_slow_ms: float = field(default_factory=lambda: float(_getenv("SQL_SLOW_MS", "100")))
+    sql_budget: int = field(default_factory=lambda: _getint("SQL_STATEMENT_BUDGET", 3))
+    sql_fingerprints: int = field(default_factory=lambda: _getint("SQL_FINGERPRINTS_MAX", 500))
 
     def sqlalchemy_url(self) -> str:
         if self.url:
@@ -71,6 +94,12 @@ class RedisConf:
     password: Optional[str] = field(default_factory=lambda: _getenv("REDIS_PASSWORD"))
     ttl_state: int = field(default_factory=lambda: _getint("REDIS_TTL_STATE", 3600))
     ttl_data: int = field(default_factory=lambda: _getint("REDIS_TTL_DATA", 7 * 24 * 3600))
+    # seconds one command (and connect) may take before it counts as a failure
+    timeout: float = field(default_factory=lambda: float(_getenv("REDIS_TIMEOUT", "0.5")))
+    # coalesce concurrent GETs into MGET: same loop tick (window 0) or a window in ms
+    batch_gets: bool = field(default_factory=lambda: _getbool("REDIS_BATCH_GETS", True))
+    batch_window_ms: float = field(default_factory=lambda: float(_getenv("REDIS_BATCH_WINDOW_MS", "0")))
+    batch_max_keys: int = field(default_factory=lambda: _getint("REDIS_BATCH_MAX_KEYS", 256))
 
     def url_or_build(self) -> str:
         if self.url:
@@ -81,12 +110,46 @@ class RedisConf:
         return f"redis://{self.host}:{self.port}/{self.db}"
 
 
+@dataclass
+class CacheConf:
+    lang_size: int = field(default_factory=lambda: _getint("LANG_CACHE_SIZE", 100_000))
+    lang_ttl: int = field(default_factory=lambda: _getint("LANG_CACHE_TTL", 300))
+    # compact /start profiles, kept apart so they don't evict language entries
+    profile_size: int = field(default_factory=lambda: _getint("PROFILE_CACHE_SIZE", 100_000))
+    # TTL of "no language yet" / "unknown user" markers
+    lang_neg_ttl: int = field(default_factory=lambda: _getint("LANG_NEG_CACHE_TTL", 120))
+    # cross-replica lock around a lang cache miss (ms, 0 = in-process single-flight only)
+    lang_lock_ms: int = field(default_factory=lambda: _getint("LANG_LOCK_MS", 0))
+
+
 @dataclass
 class BotConf:
     token: str = field(default_factory=lambda: _getenv("BOT_TOKEN", ""))
-    run_mode: str = field(default_factory=lambda: _getenv("RUN_MODE", "polling"))  # polling|webhook|local
+    run_mode: str = field(default_factory=lambda: _getenv("RUN_MODE", "polling"))  # polling|webhook|workers|local
     username: Optional[str] = field(default_factory=lambda: _getenv("BOT_USERNAME"))
     log_level: str = field(default_factory=lambda: _getenv("LOG_LEVEL", "INFO"))
+    # render/write logs on a background thread through a bounded queue
+    log_async: bool = field(default_factory=lambda: _getbool("LOG_ASYNC", True))
+    log_queue_size: int = field(default_factory=lambda: _getint("LOG_QUEUE_SIZE", 10_000))
+    # share of LOG_SAMPLED_EVENTS lines kept (debug/info only)
+    log_sample_rate: float = field(default_factory=lambda: float(_getenv("LOG_SAMPLE_RATE", "1.0")))
+    log_sampled_events: frozenset = field(default_factory=lambda: frozenset(
+        e.strip() for e in _getenv(
+            "LOG_SAMPLED_EVENTS", "update_handled,lang_redis_hit,lang_db_hit,lang_redis_set"
+        ).split(",") if e.strip()
+    ))
+    # translation files (<lang>.json); LOCALES_RELOAD seconds between change checks, 0 = off
+    locales_dir: Optional[str] = field(default_factory=lambda: _getenv("LOCALES_DIR"))
+    locales_reload: int = field(default_factory=lambda: _getint("LOCALES_RELOAD", 0))
+    update_concurrency: int = field(default_factory=lambda: _getint("UPDATE_CONCURRENCY", 100))
+    update_queue_limit: int = field(default_factory=lambda: _getint("UPDATE_QUEUE_LIMIT", 10_000))
+    update_drain_timeout: int = field(default_factory=lambda: _getint("UPDATE_DRAIN_TIMEOUT", 10))
+    # drop redelivered updates: recent update_ids kept locally and as SET NX keys in Redis (seconds)
+    update_dedup: bool = field(default_factory=lambda: _getbool("UPDATE_DEDUP", True))
+    update_dedup_ttl: int = field(default_factory=lambda: _getint("UPDATE_DEDUP_TTL", 3600))
+    # claim held while a handler runs; it lapses this fast if the instance dies mid-update
+    update_dedup_processing_ttl: int = field(default_factory=lambda: _getint("UPDATE_DEDUP_PROCESSING_TTL", 30))
+    update_dedup_local: int = field(default_factory=lambda: _getint("UPDATE_DEDUP_LOCAL", 10_000))
 
 
 @dataclass
@@ -96,6 +159,73 @@ class WebhookConf:
     secret: Optional[str] = field(default_factory=lambda: _getenv("WEBHOOK_SECRET"))
     host: Optional[str] = field(default_factory=lambda: _getenv("WEBHOOK_HOST"))
     port: int = field(default_factory=lambda: _getint("WEBHOOK_PORT", 8443))
+    max_tasks: int = field(default_factory=lambda: _getint("WEBHOOK_MAX_TASKS", 1000))
+    shutdown_timeout: int = field(default_factory=lambda: _getint("WEBHOOK_SHUTDOWN_TIMEOUT", 10))
+    workers: int = field(default_factory=lambda: _getint("WEBHOOK_WORKERS", 0))  # 0 = one per CPU
+
+    def path(self) -> str:
+        return (urlparse(self.url).path if self.url else "") or "/webhook"
+
+
+@dataclass
+class MetricsConf:
+    enabled: bool = field(default_factory=lambda: _getbool("METRICS_ENABLED", True))
+    host: str = field(default_factory=lambda: _getenv("METRICS_HOST", "0.0.0.0"))
+    port: int = field(default_factory=lambda: _getint("METRICS_PORT", 9100))
+    path: str = field(default_factory=lambda: _getenv("METRICS_PATH", "/metrics"))
+    # required (X-Debug-Token header) for /debug/* routes; without it they are only served on the
+    # dedicated metrics server, never on the public webhook app
+    debug_token: str = field(default_factory=lambda: _getenv("METRICS_DEBUG_TOKEN", ""))
+
+
+@dataclass
+class SendConf:
+    # Telegram flood limits: ~30 msg/s overall, 1 msg/s per private chat, 20 msg/min per group
+    global_rate: float = field(default_factory=lambda: float(_getenv("SEND_GLOBAL_RATE", "28")))
+    chat_rate: float = field(default_factory=lambda: float(_getenv("SEND_CHAT_RATE", "1")))
+    chat_burst: int = field(default_factory=lambda: _getint("SEND_CHAT_BURST", 3))
+    group_rate_per_min: int = field(default_factory=lambda: _getint("SEND_GROUP_RATE_PER_MIN", 20))
+    max_retries: int = field(default_factory=lambda: _getint("SEND_MAX_RETRIES", 3))
+
+
+@dataclass
+class BroadcastConf:
+    # messages per second; stays under SEND_GLOBAL_RATE so interactive replies keep flowing
+    rate: float = field(default_factory=lambda: float(_getenv("BROADCAST_RATE", "20")))
+    chunk: int = field(default_factory=lambda: _getint("BROADCAST_CHUNK", 500))
+    window: int = field(default_factory=lambda: _getint("BROADCAST_WINDOW", 5000))
+
+
+@dataclass
+class PollingConf:
+    # on start, updates queued beyond this many are skipped (0 = catch up on all of them)
+    backlog_max: int = field(default_factory=lambda: _getint("POLLING_BACKLOG_MAX", 1000))
+    # getUpdates batch size (1-100) and long-poll seconds
+    limit: int = field(default_factory=lambda: _getint("POLLING_LIMIT", 100))
+    timeout: int = field(default_factory=lambda: _getint("POLLING_TIMEOUT", 30))
+    # fetched updates buffered ahead of the scheduler; the fetcher waits when it is full
+    buffer: int = field(default_factory=lambda: _getint("POLLING_BUFFER", 1000))
+
+
+@dataclass
+class TraceConf:
+    # share of updates traced (0 = tracing off); spans go to a JSON-lines file or an OTLP/HTTP collector
+    sample_rate: float = field(default_factory=lambda: float(_getenv("TRACE_SAMPLE_RATE", "0")))
+    exporter: str = field(default_factory=lambda: _getenv("TRACE_EXPORTER", "file"))  # file|otlp
+    file: str = field(default_factory=lambda: _getenv("TRACE_FILE", "traces.jsonl"))
+    otlp_endpoint: str = field(default_factory=lambda: _getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318"))
+    service_name: str = field(default_factory=lambda: _getenv("TRACE_SERVICE_NAME", "telegram-bot"))
+    batch_size: int = field(default_factory=lambda: _getint("TRACE_BATCH_SIZE", 512))
+    export_interval: float = field(default_factory=lambda: float(_getenv("TRACE_EXPORT_INTERVAL", "5")))
+    # finished spans kept while the exporter is behind; more are dropped
+    queue_size: int = field(default_factory=lambda: _getint("TRACE_QUEUE_SIZE", 10_000))
+
+
+@dataclass
+class BreakerConf:
+    # consecutive failures that open a Redis/Postgres breaker; seconds between recovery probes
+    failures: int = field(default_factory=lambda: _getint("BREAKER_FAILURES", 5))
+    probe_interval: float = field(default_factory=lambda: float(_getenv("BREAKER_PROBE_INTERVAL", "2")))
 
 
 @dataclass
@@ -103,7 +233,14 @@ class Conf:
     bot: BotConf = field(default_factory=BotConf)
     db: DBConf = field(default_factory=DBConf)
     redis: RedisConf = field(default_factory=RedisConf)
+    cache: CacheConf = field(default_factory=CacheConf)
     webhook: WebhookConf = field(default_factory=WebhookConf)
+    metrics: MetricsConf = field(default_factory=MetricsConf)
+    send: SendConf = field(default_factory=SendConf)
+    broadcast: BroadcastConf = field(default_factory=BroadcastConf)
+    breaker: BreakerConf = field(default_factory=BreakerConf)
+    polling: PollingConf = field(default_factory=PollingConf)
+    trace: TraceConf = field(default_factory=TraceConf)
     admin: Optional[int] = field(default_factory=lambda: _getint("ADMIN", None))
 
 
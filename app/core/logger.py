@@ -1,6 +1,12 @@
 # app/core/logger.py
+import atexit
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+import threading
+from contextvars import ContextVar
 from typing import Optional
 
 import orjson
@@ -8,9 +14,132 @@ import structlog
 
 from app.core.config import conf  # sizning conf obyekt
 
+# levels that may be sampled away; warning and above are always kept
+SAMPLED_LEVELS = {"debug", "info"}
+# lines handed to the writer thread per write() call
+WRITE_BATCH = 256
+# how long an error may block the event loop waiting for room in a full queue
+ERROR_PUT_TIMEOUT = 0.1
+
 def orjson_dumps(v, *, default=None):
     return orjson.dumps(v, default=default).decode()
 
+def sample_events(logger, method_name, event_dict):
+    # keep LOG_SAMPLE_RATE of the high-volume events (update_handled, cache hits, ...)
+    if (
+        method_name in SAMPLED_LEVELS
+        and event_dict.get("event") in conf.bot.log_sampled_events
+        and random.random() >= conf.bot.log_sample_rate
+    ):
+        raise structlog.DropEvent
+    return event_dict
+
+class QueueLogWriter:
+    # Owns stdout: a daemon thread renders event dicts to JSON and writes them in batches,
+    # so a slow terminal or log collector never blocks the event loop. When the queue is full
+    # lines are dropped (errors wait briefly first) and the count is reported later.
+    def __init__(self, stream, maxsize: int):
+        self.stream = stream
+        self.queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=maxsize)
+        # bumped from the loop and from stdlib logging threads, read by the writer thread
+        self._dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, event_dict: dict, level: str) -> None:
+        try:
+            self.queue.put_nowait(event_dict)
+        except queue.Full:
+            if level in SAMPLED_LEVELS or level == "warning":
+                self.drop()
+                return
+            try:
+                self.queue.put(event_dict, timeout=ERROR_PUT_TIMEOUT)
+            except queue.Full:
+                self.drop()
+
+    def drop(self) -> None:
+        with self._dropped_lock:
+            self._dropped += 1
+
+    def _take_dropped(self) -> int:
+        with self._dropped_lock:
+            dropped, self._dropped = self._dropped, 0
+        return dropped
+
+    def close(self, timeout: float = 2.0) -> None:
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            lines = [self._render(e) for e in batch if e is not None]
+            dropped = self._take_dropped()
+            if dropped:
+                lines.append(self._render({"event": "log_dropped", "count": dropped, "level": "warning"}))
+            try:
+                self.stream.write(b"".join(lines))
+                self.stream.flush()
+            except Exception:
+                pass
+            if stop:
+                return
+
+    @staticmethod
+    def _render(event_dict: dict) -> bytes:
+        try:
+            return orjson.dumps(event_dict, default=str) + b"\n"
+        except Exception:
+            return orjson.dumps({"event": "log_render_failed", "repr": repr(event_dict)}) + b"\n"
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    # the stdlib enqueue() lets queue.Full reach handleError (a traceback on stderr per record);
+    # a full queue drops the record and counts it with the structlog drops instead
+    def __init__(self, q: queue.Queue, writer: QueueLogWriter):
+        super().__init__(q)
+        self._writer = writer
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._writer.drop()
+
+class QueueLogger:
+    # structlog logger: receives the processed event dict and only enqueues it
+    def __init__(self, writer: QueueLogWriter):
+        self._writer = writer
+
+    def _make(level):
+        def log(self, **event_dict):
+            self._writer.put(event_dict, level)
+        return log
+
+    debug = _make("debug")
+    info = msg = _make("info")
+    warning = _make("warning")
+    error = exception = _make("error")
+    critical = fatal = _make("critical")
+    del _make
+
+class QueueLoggerFactory:
+    def __init__(self, writer: QueueLogWriter):
+        self._logger = QueueLogger(writer)
+
+    def __call__(self, *args):
+        return self._logger
+
 def setup_logger():
     # Get desired level from config (string like "INFO")
     level_name = (getattr(conf, "bot", None) and getattr(conf.bot, "log_level", None)) or "INFO"
@@ -24,20 +153,36 @@ def setup_logger():
     handler = logging.StreamHandler(sys.stdout)
     handler.setLevel(level)
     handler.setFormatter(logging.Formatter("%(message)s"))
-    root.addHandler(handler)
     root.setLevel(level)
 
-    # Minimal fast processors: timestamp + level + JSON render
+    # Minimal fast processors: sampling + timestamp + level (+ traceback text for exc_info)
     processors = [
+        sample_events,
         structlog.processors.TimeStamper(fmt="iso", utc=True),
         structlog.processors.add_log_level,
-        structlog.processors.JSONRenderer(serializer=orjson_dumps),
+        structlog.processors.format_exc_info,
     ]
 
+    if conf.bot.log_async:
+        # rendering and the write happen on the writer thread; the loop only enqueues a dict
+        writer = QueueLogWriter(sys.stdout.buffer, maxsize=conf.bot.log_queue_size)
+        atexit.register(writer.close)
+        logger_factory = QueueLoggerFactory(writer)
+        # stdlib records (aiogram, aiohttp) go through a queue too
+        std_queue = queue.Queue(maxsize=conf.bot.log_queue_size)
+        root.addHandler(DroppingQueueHandler(std_queue, writer))
+        listener = logging.handlers.QueueListener(std_queue, handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+    else:
+        processors.append(structlog.processors.JSONRenderer(serializer=orjson_dumps))
+        logger_factory = structlog.PrintLoggerFactory()
+        root.addHandler(handler)
+
     structlog.configure(
         processors=processors,
         wrapper_class=structlog.make_filtering_bound_logger(level),
-        logger_factory=structlog.PrintLoggerFactory(),
+        logger_factory=logger_factory,
         cache_logger_on_first_use=True,
     )
 
@@ -51,5 +196,8 @@ def setup_logger():
 
 _logger = setup_logger()
 
+# set by RequestIDMiddleware for the update being handled; read where data["request_id"] isn't reachable
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
 def get_logger(request_id: Optional[str] = None):
     return _logger.bind(rid=request_id) if request_id else _logger
@@ -0,0 +1,148 @@
+# app/core/metrics.py
+import hmac
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from app.core.config import conf
+from app.core.logger import get_logger
+
+logger = get_logger()
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UPDATE_LATENCY = Histogram(
+    "bot_update_duration_seconds", "Time to process one update end to end", ["update_type"],
+    buckets=LATENCY_BUCKETS,
+)
+UPDATES_TOTAL = Counter("bot_updates_total", "Processed updates", ["update_type", "status"])
+UPDATES_DUPLICATE = Counter("bot_updates_duplicate_total", "Redelivered updates dropped", ["source"])
+HANDLER_LATENCY = Histogram(
+    "bot_handler_duration_seconds", "Time spent inside a handler", ["handler"], buckets=LATENCY_BUCKETS,
+)
+
+DB_COMMITS = Counter("bot_db_commits_total", "Commits issued by DBSessionMiddleware")
+DB_ROLLBACKS = Counter("bot_db_rollbacks_total", "Rollbacks issued by DBSessionMiddleware")
+DB_POOL_CHECKED_OUT = Gauge("bot_db_pool_checked_out", "Connections currently checked out of the pool")
+DB_POOL_OVERFLOW = Gauge("bot_db_pool_overflow", "Connections opened beyond pool_size")
+DB_POOL_SIZE = Gauge("bot_db_pool_size", "Configured pool size")
+DB_POOL_WAIT = Histogram(
+    "bot_db_pool_wait_seconds", "Time to acquire a connection for a session", buckets=LATENCY_BUCKETS,
+)
+DB_REPLICA_LAG = Gauge("bot_db_replica_lag_seconds", "Replication lag measured by the replica monitor", ["replica"])
+DB_REPLICA_HEALTHY = Gauge("bot_db_replica_healthy", "1 if the replica is used for reads", ["replica"])
+DB_READS = Counter("bot_db_reads_total", "Read statements by target", ["target"])
+DB_STATEMENTS_PER_UPDATE = Histogram(
+    "bot_db_statements_per_update", "SQL statements run while handling one update",
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 20, 50),
+)
+DB_SLOW_QUERIES = Counter("bot_db_slow_queries_total", "Statements slower than SQL_SLOW_MS")
+PROFILE_WRITES_DROPPED = Counter(
+    "bot_profile_writes_dropped_total", "Profile refreshes the write-behind buffer gave up on", ["reason"],
+)
+
+SCHEDULER_QUEUED = Gauge("bot_scheduler_queued", "Updates accepted but not started yet")
+SCHEDULER_ACTIVE = Gauge("bot_scheduler_active", "Chats currently being processed")
+SCHEDULER_CHATS = Gauge("bot_scheduler_chats", "Chats with queued or running updates")
+POLLING_BUFFERED = Gauge("bot_polling_buffered", "Fetched updates waiting to be handed to the scheduler")
+POLLING_LAG = Histogram(
+    "bot_polling_lag_seconds", "Time from getUpdates returning to the update's handler starting",
+    buckets=LATENCY_BUCKETS,
+)
+
+REDIS_LATENCY = Histogram(
+    "bot_redis_command_duration_seconds", "Redis command round trip", ["command"], buckets=LATENCY_BUCKETS,
+)
+BREAKER_STATE = Gauge("bot_circuit_open", "1 while the dependency's circuit breaker is open", ["breaker"])
+BREAKER_REJECTED = Counter("bot_circuit_rejected_total", "Calls failed fast by an open breaker", ["breaker"])
+TRACE_SPANS = Counter("bot_trace_spans_total", "Finished trace spans", ["result"])
+
+SINGLEFLIGHT_CALLS = Counter(
+    "bot_singleflight_calls_total", "Lookups that ran (leader) or joined one in flight (shared)", ["name", "role"],
+)
+REDIS_BATCH_SIZE = Histogram(
+    "bot_redis_get_batch_keys", "Distinct keys per coalesced GET batch", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+SEND_QUEUE_DEPTH = Gauge("bot_send_queue_depth", "Outgoing requests waiting for a global send token")
+SEND_DELAY = Histogram(
+    "bot_send_delay_seconds", "Time an outgoing request waited for rate limit tokens", ["method"],
+    buckets=LATENCY_BUCKETS,
+)
+SEND_RETRY_AFTER = Counter("bot_send_retry_after_total", "429 responses received from Telegram", ["method"])
+
+BROADCAST_SENT = Counter("bot_broadcast_messages_total", "Broadcast deliveries", ["status"])
+
+
+def bind_pool(engine) -> None:
+    pool = engine.pool
+    # NullPool (pgbouncer mode) has no counters
+    if hasattr(pool, "checkedout"):
+        DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+    if hasattr(pool, "overflow"):
+        DB_POOL_OVERFLOW.set_function(lambda: max(pool.overflow(), 0))
+    if hasattr(pool, "size"):
+        DB_POOL_SIZE.set_function(pool.size)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(body=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+Handler = Callable[[web.Request], Awaitable[web.Response]]
+
+DEBUG_TOKEN_HEADER = "X-Debug-Token"
+
+# extra on-demand endpoints (e.g. /debug/sql) served next to /metrics: (method, path, handler)
+DEBUG_ROUTES: List[Tuple[str, str, Handler]] = []
+
+
+def add_debug_route(path: str, handler: Handler, method: str = "GET") -> None:
+    DEBUG_ROUTES.append((method, path, handler))
+
+
+def _require_token(handler: Handler) -> Handler:
+    async def guarded(request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(DEBUG_TOKEN_HEADER, ""), conf.metrics.debug_token):
+            return web.Response(status=401)
+        return await handler(request)
+    return guarded
+
+
+def add_metrics_route(app: web.Application, public: bool = False) -> None:
+    # public: the webhook app, reachable from the internet - debug routes only with a token
+    if not conf.metrics.enabled:
+        return
+    app.router.add_get(conf.metrics.path, metrics_handler)
+    token = conf.metrics.debug_token
+    if public and not token:
+        return
+    for method, path, handler in DEBUG_ROUTES:
+        app.router.add_route(method, path, _require_token(handler) if token else handler)
+
+
+_runner: Optional[web.AppRunner] = None
+
+
+async def start_metrics_server(port: Optional[int] = None) -> None:
+    # polling mode has no web app of its own, and webhook workers each need their own port
+    # (the registry is per process), so serve /metrics from a small one
+    global _runner
+    if not conf.metrics.enabled or _runner is not None:
+        return
+    port = port or conf.metrics.port
+    app = web.Application()
+    add_metrics_route(app)
+    _runner = web.AppRunner(app, access_log=None)
+    await _runner.setup()
+    await web.TCPSite(_runner, host=conf.metrics.host, port=port).start()
+    logger.info("metrics server started", host=conf.metrics.host, port=port)
+
+
+async def stop_metrics_server() -> None:
+    global _runner
+    if _runner is None:
+        return
+    await _runner.cleanup()
+    _runner = None
@@ -0,0 +1,43 @@
+# app/core/startup.py
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from app.core.logger import get_logger
+
+logger = get_logger()
+
+
+# Collects how long each startup step took and logs them as one "startup_timing" line,
+# so slow rolling restarts can be traced to imports, Redis, DB or webhook registration.
+class StartupTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def mark_imports(self, t0: float) -> None:
+        # t0: perf_counter() taken before the entry point's first import
+        self.started = t0
+        self.record("imports", time.perf_counter() - t0)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.stages[name] = seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def report(self, **extra) -> None:
+        logger.info(
+            "startup_timing",
+            total_ms=round((time.perf_counter() - self.started) * 1000, 1),
+            **{f"{name}_ms": round(seconds * 1000, 1) for name, seconds in self.stages.items()},
+            **extra,
+        )
+
+
+startup_timer = StartupTimer()
@@ -0,0 +1,251 @@
+# app/core/tracing.py
+import asyncio
+import random
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+import orjson
+from aiogram import BaseMiddleware
+
+from app.core.config import conf
+from app.core.logger import get_logger
+from app.core.metrics import TRACE_SPANS
+
+logger = get_logger()
+
+SCOPE = "app.core.tracing"
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attrs", "error")
+
+    def __init__(self, trace_id: int, parent_id: Optional[int], name: str, attrs: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attrs[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": f"{self.trace_id:032x}",
+            "span_id": f"{self.span_id:016x}",
+            "parent_id": f"{self.parent_id:016x}" if self.parent_id else None,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": f"{self.trace_id:032x}",
+            "spanId": f"{self.span_id:016x}",
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attrs(self.attrs),
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = f"{self.parent_id:016x}"
+        return span
+
+
+def _otlp_attrs(attrs: Dict[str, Any]) -> List[dict]:
+    out = []
+    for key, value in attrs.items():
+        if isinstance(value, bool):
+            v = {"boolValue": value}
+        elif isinstance(value, int):
+            v = {"intValue": str(value)}
+        elif isinstance(value, float):
+            v = {"doubleValue": value}
+        else:
+            v = {"stringValue": str(value)}
+        out.append({"key": key, "value": v})
+    return out
+
+
+# the innermost open span of the current task (tasks inherit it when created)
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+class _Scope:
+    __slots__ = ("tracer", "span", "token")
+
+    def __init__(self, tracer: "Tracer", span: Span):
+        self.tracer = tracer
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current.reset(self.token)
+        if exc_type is not None:
+            self.span.error = exc_type.__name__
+        self.tracer.finish(self.span)
+
+
+class _NoopScope:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+NOOP = _NoopScope()
+
+
+# Spans are only recorded inside a sampled trace: trace() makes the sampling decision for a
+# root span (one per update) and span()/child() are no-ops outside of one, so unsampled
+# updates cost a ContextVar lookup per instrumented call. Finished spans are buffered and
+# written in batches by a background task.
+class Tracer:
+    def __init__(self, sample_rate: float):
+        self.sample_rate = sample_rate
+        self._buffer: List[Span] = []
+        self._flush_now = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._http: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def trace(self, name: str, **attrs):
+        if not self.enabled or random.random() >= self.sample_rate:
+            return NOOP
+        return _Scope(self, Span(random.getrandbits(128), None, name, attrs))
+
+    def span(self, name: str, **attrs):
+        parent = _current.get()
+        if parent is None:
+            return NOOP
+        return _Scope(self, Span(parent.trace_id, parent.span_id, name, attrs))
+
+    def child(self, name: str, **attrs) -> Optional[Span]:
+        # for callers that can't use a with-block (event hooks); close with finish()
+        parent = _current.get()
+        if parent is None:
+            return None
+        return Span(parent.trace_id, parent.span_id, name, attrs)
+
+    def finish(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        if len(self._buffer) >= conf.trace.queue_size:
+            TRACE_SPANS.labels("dropped").inc()
+            return
+        self._buffer.append(span)
+        if len(self._buffer) >= conf.trace.batch_size:
+            self._flush_now.set()
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        if conf.trace.exporter == "otlp":
+            self._http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        self._task = asyncio.create_task(self._export_loop())
+        logger.info("tracing_started", sample_rate=self.sample_rate, exporter=conf.trace.exporter)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._export()
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+
+    async def _export_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), conf.trace.export_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self._export()
+
+    async def _export(self) -> None:
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        try:
+            if self._http is not None:
+                await self._post_otlp(batch)
+            else:
+                await asyncio.to_thread(_append_lines, conf.trace.file, batch)
+        except Exception as e:
+            TRACE_SPANS.labels("failed").inc(len(batch))
+            logger.warning("trace_export_failed", spans=len(batch), error=repr(e))
+            return
+        TRACE_SPANS.labels("exported").inc(len(batch))
+
+    async def _post_otlp(self, batch: List[Span]) -> None:
+        body = {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attrs({"service.name": conf.trace.service_name})},
+            "scopeSpans": [{"scope": {"name": SCOPE}, "spans": [s.to_otlp() for s in batch]}],
+        }]}
+        async with self._http.post(conf.trace.otlp_endpoint.rstrip("/") + "/v1/traces", data=orjson.dumps(body),
+                                   headers={"Content-Type": "application/json"}) as resp:
+            resp.raise_for_status()
+
+
+def _append_lines(path: str, batch: List[Span]) -> None:
+    with Path(path).open("ab") as f:
+        f.write(b"".join(orjson.dumps(s.to_dict(), default=str) + b"\n" for s in batch))
+
+
+tracer = Tracer(conf.trace.sample_rate)
+
+
+class TraceUpdateMiddleware(BaseMiddleware):
+    # root span of an update; everything below it (middlewares, handler, I/O) nests inside
+    async def __call__(self, handler: Callable[[Any, dict], Awaitable[Any]], event: Any, data: dict):
+        with tracer.trace("update", update_id=event.update_id) as span:
+            if span is not None:
+                try:
+                    span.set("update_type", event.event_type)
+                except Exception:
+                    pass
+            try:
+                return await handler(event, data)
+            finally:
+                if span is not None and data.get("request_id"):
+                    span.set("request_id", data["request_id"])
+
+
+class TracedMiddleware(BaseMiddleware):
+    def __init__(self, middleware: BaseMiddleware):
+        self.middleware = middleware
+        self.name = type(middleware).__name__
+
+    async def __call__(self, handler: Callable[[Any, dict], Awaitable[Any]], event: Any, data: dict):
+        with tracer.span(self.name):
+            return await self.middleware(handler, event, data)
+
+
+def traced(middleware: BaseMiddleware) -> BaseMiddleware:
+    # tracing off: register the middleware as is, without the wrapper's extra call
+    return TracedMiddleware(middleware) if tracer.enabled else middleware
@@ -0,0 +1,197 @@
+# app/db/instrumentation.py
+import re
+import time
+from contextvars import ContextVar, Token
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import orjson
+from aiohttp import web
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import conf
+from app.core.logger import get_logger, request_id_var
+from app.core.metrics import DB_SLOW_QUERIES, DB_STATEMENTS_PER_UPDATE, add_debug_route
+from app.core.tracing import tracer
+
+logger = get_logger()
+
+STATEMENT_ATTR_LEN = 200
+OTHER = "<other>"
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAMS = re.compile(r"\$\d+(?:::\w+(?:\[\])?)?|%\(\w+\)s|\?")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_REPEATED = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    # same query shape -> same key: literals and bind params become ?, IN lists and
+    # multi-row VALUES collapse to (...)
+    s = " ".join(statement.split())
+    s = _LITERALS.sub("?", _PARAMS.sub("?", s))
+    s = _LISTS.sub("(...)", s)
+    return _REPEATED.sub("(...)", s)
+
+
+def redact(parameters, executemany: bool = False):
+    # types only: values may be user data (names, usernames, chat ids)
+    if executemany and isinstance(parameters, (list, tuple)):
+        return f"{len(parameters)} rows"
+    if isinstance(parameters, dict):
+        return {k: type(v).__name__ for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(v).__name__ for v in parameters]
+    return type(parameters).__name__
+
+
+class UpdateStatements:
+    __slots__ = ("count", "seconds", "fingerprints")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints: List[str] = []
+
+
+# statements of the update being handled (DBSessionMiddleware opens and closes the scope)
+_update: ContextVar[Optional[UpdateStatements]] = ContextVar("sql_update", default=None)
+
+
+# Times every statement from the engine's cursor events (they run in a greenlet that shares
+# the calling task's contextvars, so request_id and the open trace span are visible there).
+# Keeps per-fingerprint totals, logs slow statements with redacted parameters and counts the
+# statements of each update against SQL_STATEMENT_BUDGET.
+class SqlProfiler:
+    def __init__(self, slow_ms: float, budget: int, max_fingerprints: int):
+        self.slow = slow_ms / 1000
+        self.budget = budget
+        self.max_fingerprints = max_fingerprints
+        self.stats: Dict[str, dict] = {}
+        self.started = time.time()
+
+    def record(self, statement: str, parameters, executemany: bool, seconds: float, rows: int) -> None:
+        key = fingerprint(statement)
+        entry = self.stats.get(key)
+        if entry is None:
+            if len(self.stats) >= self.max_fingerprints:
+                key = OTHER
+                entry = self.stats.get(key)
+            if entry is None:
+                entry = self.stats[key] = {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0}
+        ms = seconds * 1000
+        entry["calls"] += 1
+        entry["total_ms"] += ms
+        entry["max_ms"] = max(entry["max_ms"], ms)
+        entry["rows"] += max(rows, 0)
+
+        update = _update.get()
+        if update is not None:
+            update.count += 1
+            update.seconds += seconds
+            update.fingerprints.append(key)
+        if seconds >= self.slow:
+            DB_SLOW_QUERIES.inc()
+            logger.warning("slow_query", rid=request_id_var.get(), ms=round(ms, 2), statement=key,
+                           params=redact(parameters, executemany), rows=rows)
+
+    def begin_update(self) -> Token:
+        return _update.set(UpdateStatements())
+
+    def end_update(self, token: Token) -> None:
+        update = _update.get()
+        _update.reset(token)
+        if update is None:
+            return
+        DB_STATEMENTS_PER_UPDATE.observe(update.count)
+        if self.budget and update.count > self.budget:
+            logger.warning("sql_budget_exceeded", rid=request_id_var.get(), statements=update.count,
+                           budget=self.budget, ms=round(update.seconds * 1000, 2), fingerprints=update.fingerprints)
+
+    def snapshot(self, sort: str = "total_ms", limit: int = 50) -> dict:
+        rows = [{"fingerprint": k, **v, "mean_ms": v["total_ms"] / v["calls"]} for k, v in self.stats.items()]
+        rows.sort(key=lambda r: r.get(sort, 0), reverse=True)
+        for r in rows:
+            for f in ("total_ms", "max_ms", "mean_ms"):
+                r[f] = round(r[f], 3)
+        return {"since": self.started, "fingerprints": len(self.stats), "statements": rows[:limit]}
+
+    def reset(self) -> None:
+        self.stats.clear()
+        self.started = time.time()
+
+
+profiler: Optional[SqlProfiler] = (
+    SqlProfiler(conf.db.sql_slow_ms, conf.db.sql_budget, conf.db.sql_fingerprints) if conf.db.sql_profile else None
+)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    if profiler is None and not tracer.enabled:
+        return
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_execute)
+    event.listen(sync_engine, "handle_error", _on_error)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    context._trace_span = tracer.child(
+        "sql", statement=" ".join(statement.split())[:STATEMENT_ATTR_LEN], many=executemany,
+    ) if tracer.enabled else None
+    context._query_start = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    rows = cursor.rowcount if cursor.rowcount is not None else -1
+    if profiler is not None:
+        profiler.record(statement, parameters, executemany, elapsed, rows)
+    span = context._trace_span
+    if span is not None:
+        if rows >= 0:
+            span.set("rows", rows)
+        tracer.finish(span)
+        context._trace_span = None
+
+
+def _on_error(exception_context):
+    context = exception_context.execution_context
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        span.error = type(exception_context.original_exception).__name__
+        tracer.finish(span)
+        context._trace_span = None
+
+
+async def sql_stats_handler(request: web.Request) -> web.Response:
+    # GET /debug/sql?sort=total_ms|calls|max_ms|mean_ms&limit=50
+    if profiler is None:
+        return web.json_response({"error": "SQL_PROFILE is off"}, status=404)
+    sort = request.query.get("sort", "total_ms")
+    try:
+        limit = int(request.query.get("limit", "50"))
+    except ValueError:
+        return web.json_response({"error": "limit must be an integer"}, status=400)
+    body = profiler.snapshot(sort=sort, limit=limit)
+    return web.Response(body=orjson.dumps(body), content_type="application/json")
+
+
+async def sql_reset_handler(request: web.Request) -> web.Response:
+    # POST /debug/sql/reset: returns the totals collected so far, then starts over
+    if profiler is None:
+        return web.json_response({"error": "SQL_PROFILE is off"}, status=404)
+    body = profiler.snapshot()
+    profiler.reset()
+    return web.Response(body=orjson.dumps(body), content_type="application/json")
+
+
+add_debug_route("/debug/sql", sql_stats_handler)
+add_debug_route("/debug/sql/reset", sql_reset_handler, method="POST")
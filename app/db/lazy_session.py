@@ -1,15 +1,51 @@
 # app/db/lazy_session.py
 
+import asyncio
+import time
 from typing import Optional, Callable, Any, cast
 
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.selectable import CTE
+from sqlalchemy.sql.visitors import iterate
+
+from app.core.metrics import DB_POOL_WAIT, DB_READS
+from app.core.tracing import tracer
+from app.db.replicas import Replica, ReplicaSet
+from app.utils.circuit_breaker import CircuitBreaker
+
+# the primary is unreachable or saturated (not a constraint violation or a bad query)
+UNAVAILABLE_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError, OSError, asyncio.TimeoutError)
+
+
+def is_unavailable(exc: BaseException) -> bool:
+    return isinstance(exc, UNAVAILABLE_ERRORS) or (isinstance(exc, DBAPIError) and exc.connection_invalidated)
+
+
+def is_read_only(statement) -> bool:
+    # plain SELECT: no FOR UPDATE, no INSERT/UPDATE ... RETURNING hidden in a CTE
+    if not isinstance(statement, Select) or statement._for_update_arg is not None:
+        return False
+    if statement.get_execution_options().get("primary"):
+        return False
+    return not any(isinstance(el, CTE) and el.element.is_dml for el in iterate(statement))
 
 
 class LazySessionProxy:
-    def __init__(self, session_maker: Callable[..., AsyncSession]):
+    def __init__(self, session_maker: Callable[..., AsyncSession], replicas: Optional[ReplicaSet] = None,
+                 breaker: Optional[CircuitBreaker] = None):
         self._maker = session_maker
+        self._breaker = breaker
         self._session: Optional[AsyncSession] = None
         self.session_created: bool = False
+        self._connected: bool = False
+        # reads go to a replica until the first write or commit; after that the primary
+        # serves everything so the handler reads its own writes
+        self._replicas = replicas
+        self._replica: Optional[Replica] = None
+        self._replica_session: Optional[AsyncSession] = None
+        self._primary_only: bool = not replicas
 
     def _ensure(self) -> AsyncSession:
         if not self._session:
@@ -31,8 +67,80 @@ class LazySessionProxy:
     def info(self) -> dict:
         return self._ensure().info
 
-    async def execute(self, *args, **kwargs):
-        return await self._ensure().execute(*args, **kwargs)
+    async def _connect(self, session: AsyncSession) -> None:
+        # first statement of the session: time the pool checkout separately
+        start = time.perf_counter()
+        with tracer.span("db.connect"):
+            await session.connection()
+        DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+    async def execute(self, statement, *args, **kwargs):
+        if not self._primary_only:
+            writes = self._session is not None and self._session.info.get("writes")
+            if not writes and is_read_only(statement):
+                result = await self._execute_on_replica(statement, *args, **kwargs)
+                if result is not None:
+                    return result
+                DB_READS.labels("primary").inc()
+            else:
+                self._primary_only = True
+                await self._close_replica()
+        breaker = self._breaker
+        if breaker is not None:
+            # fail fast instead of queueing on a pool that can't serve us
+            breaker.check()
+        session = self._ensure()
+        try:
+            if not self._connected:
+                await self._connect(session)
+                self._connected = True
+            result = await session.execute(statement, *args, **kwargs)
+        except Exception as e:
+            if breaker is not None and is_unavailable(e):
+                breaker.failure()
+            raise
+        if breaker is not None:
+            breaker.success()
+        return result
+
+    async def _execute_on_replica(self, statement, *args, **kwargs):
+        if self._replica_session is None:
+            replica = self._replicas.pick()
+            if replica is None:
+                return None
+            self._replica = replica
+            self._replica_session = replica.maker()
+            try:
+                await self._connect(self._replica_session)
+            except Exception as e:
+                if not is_unavailable(e):
+                    raise
+                return await self._drop_replica()
+        try:
+            result = await self._replica_session.execute(statement, *args, **kwargs)
+        except Exception as e:
+            # connection-level failure: stop using this replica, answer from the primary;
+            # a bad query would fail on the primary too, so it is raised as is
+            if not is_unavailable(e):
+                raise
+            return await self._drop_replica()
+        DB_READS.labels("replica").inc()
+        return result
+
+    async def _drop_replica(self):
+        self._replica.mark_failed()
+        await self._close_replica()
+        self._primary_only = True
+        return None
+
+    async def _close_replica(self):
+        if self._replica_session is None:
+            return
+        try:
+            await self._replica_session.close()
+        finally:
+            self._replica_session = None
+            self._replica = None
 
     async def scalar_one(self, *args, **kwargs):
         res = await self.execute(*args, **kwargs)
@@ -43,6 +151,8 @@ class LazySessionProxy:
         return res.scalars().first()
 
     async def commit(self):
+        self._primary_only = True
+        await self._close_replica()
         if not self._session:
             return None
         return await self._session.commit()
@@ -53,6 +163,7 @@ class LazySessionProxy:
         return await self._session.rollback()
 
     async def close(self):
+        await self._close_replica()
         if not self._session:
             return
         try:
@@ -60,3 +171,4 @@ class LazySessionProxy:
         finally:
             self._session = None
             self.session_created = False
+            self._connected = False
@@ -0,0 +1,113 @@
+# app/db/replicas.py
+import asyncio
+import itertools
+from typing import Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from app.core.config import conf
+from app.core.logger import get_logger
+from app.core.metrics import DB_REPLICA_HEALTHY, DB_REPLICA_LAG
+
+logger = get_logger()
+
+# seconds behind the primary; 0 when the replica has replayed everything it received
+LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class Replica:
+    def __init__(self, url: str, engine_factory: Callable[[str], AsyncEngine]):
+        self.url = url
+        self.name = make_url(url).host or url
+        self._factory = engine_factory
+        self._engine: Optional[AsyncEngine] = None
+        self.maker: async_sessionmaker = async_sessionmaker(class_=AsyncSession, expire_on_commit=False,
+                                                            autoflush=False)
+        # unhealthy until the first lag check passes
+        self.healthy = False
+        self.lag: Optional[float] = None
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
+            self._engine = self._factory(self.url)
+            self.maker.configure(bind=self._engine)
+        return self._engine
+
+    def mark_failed(self) -> None:
+        if self.healthy:
+            logger.warning("db_replica_unhealthy", replica=self.name, reason="query_failed")
+        self.healthy = False
+        DB_REPLICA_HEALTHY.labels(self.name).set(0)
+
+    async def check(self) -> None:
+        try:
+            async with self.engine.connect() as conn:
+                lag = float((await conn.execute(LAG_SQL)).scalar() or 0)
+        except Exception:
+            logger.warning("db_replica_check_failed", replica=self.name, exc_info=True)
+            self.lag = None
+            self.mark_failed()
+            return
+        self.lag = lag
+        healthy = lag <= conf.db.replica_max_lag
+        if healthy != self.healthy:
+            logger.info("db_replica_state", replica=self.name, healthy=healthy, lag=lag)
+        self.healthy = healthy
+        DB_REPLICA_LAG.labels(self.name).set(lag)
+        DB_REPLICA_HEALTHY.labels(self.name).set(int(healthy))
+
+    async def dispose(self) -> None:
+        if self._engine is not None:
+            await self._engine.dispose()
+
+
+# Read replicas from DB_REPLICA_URLS. A background task measures replication lag; pick()
+# round-robins over the replicas that answered and are within DB_REPLICA_MAX_LAG, and
+# returns None (use the primary) when there are none.
+class ReplicaSet:
+    def __init__(self, urls: List[str], engine_factory: Callable[[str], AsyncEngine]):
+        self.replicas = [Replica(url, engine_factory) for url in urls]
+        self._rr = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def pick(self) -> Optional[Replica]:
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._rr) % len(healthy)]
+
+    async def check(self) -> None:
+        await asyncio.gather(*(r.check() for r in self.replicas))
+
+    async def start(self) -> None:
+        if not self.replicas or self._task is not None:
+            return
+        await self.check()
+        self._task = asyncio.create_task(self._monitor())
+        logger.info("db_replicas_started", replicas=[r.name for r in self.replicas],
+                    healthy=[r.name for r in self.replicas if r.healthy])
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for r in self.replicas:
+            await r.dispose()
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(conf.db.replica_check_interval)
+            await self.check()
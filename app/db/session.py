@@ -1,43 +1,149 @@
 # app/db/session.py
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.pool import NullPool
 
 from app.core.config import conf
 from app.core.logger import get_logger
+from app.core.metrics import bind_pool
+from app.core.startup import startup_timer
+from app.db.instrumentation import instrument_engine
+from app.db.replicas import ReplicaSet
+from app.utils.circuit_breaker import make_breaker
 
 logger = get_logger()
 Base = declarative_base()
 
-if conf.db.use_pgbouncer:
-    poolclass = NullPool
-    logger.info("Using NullPool because use_pgbouncer=True (recommended for transaction pooling)")
-    _engine = create_async_engine(
-        conf.db.sqlalchemy_url(),
-        echo=False,
-        future=True,
-        pool_pre_ping=True,
-        poolclass=poolclass,
-    )
-else:
-    _engine = create_async_engine(
-        conf.db.sqlalchemy_url(),
+ROOT_DIR = Path(__file__).resolve().parents[2]
+
+_engine: Optional[AsyncEngine] = None
+
+# bound to the engine on first get_engine(); importing models (alembic env.py, tools) creates nothing
+AsyncSessionLocal = async_sessionmaker(class_=AsyncSession, expire_on_commit=False, autoflush=False)
+
+
+def _connect_args() -> dict:
+    if conf.db.driver != "asyncpg":
+        return {}
+    # asyncpg: connection open timeout and per-statement client-side timeout
+    return {"timeout": conf.db.connect_timeout, "command_timeout": conf.db.command_timeout}
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    engine = _build_engine(url)
+    instrument_engine(engine)
+    return engine
+
+
+def _build_engine(url: str) -> AsyncEngine:
+    if conf.db.use_pgbouncer:
+        poolclass = NullPool
+        logger.info("Using NullPool because use_pgbouncer=True (recommended for transaction pooling)")
+        return create_async_engine(
+            url,
+            echo=False,
+            future=True,
+            pool_pre_ping=True,
+            poolclass=poolclass,
+            connect_args=_connect_args(),
+        )
+    return create_async_engine(
+        url,
         echo=False,
         future=True,
         pool_pre_ping=True,
         pool_size=conf.db.pool_min,
         max_overflow=conf.db.pool_max,
+        pool_timeout=conf.db.pool_timeout,
+        connect_args=_connect_args(),
     )
 
-AsyncSessionLocal = async_sessionmaker(bind=_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+
+async def _probe_db() -> None:
+    async with get_engine().connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+# primary only; replicas have their own lag/health monitor
+db_breaker = make_breaker("postgres", _probe_db, probe_timeout=conf.db.connect_timeout + conf.db.command_timeout)
+
+
+# read-only engines (DB_REPLICA_URLS); LazySessionProxy routes plain SELECTs here
+replica_set = ReplicaSet(conf.db.replica_urls, _create_engine)
+
+
+def get_engine() -> AsyncEngine:
+    global _engine
+    if _engine is not None:
+        return _engine
+    _engine = _create_engine(conf.db.sqlalchemy_url())
+    bind_pool(_engine)
+    AsyncSessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def alembic_head() -> Optional[str]:
+    # newest revision in alembic/versions; reads local files only
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    cfg = Config(str(ROOT_DIR / "alembic.ini"))
+    cfg.set_main_option("script_location", str(ROOT_DIR / "alembic"))
+    return ScriptDirectory.from_config(cfg).get_current_head()
 
 
 async def init_db():
-    async with _engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    logger.info("Database initialized")
+    # DB_SCHEMA_CHECK: "revision" compares alembic_version with the migration head (one query)
+    # and only bootstraps with create_all when there are no migrations and no users table;
+    # "create_all" keeps the old behaviour; "off" just connects.
+    engine = get_engine()
+    mode = conf.db.schema_check
+    with startup_timer.stage("db_connect"):
+        conn = await engine.connect()
+    try:
+        with startup_timer.stage("db_schema_check"):
+            if mode == "create_all":
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.commit()
+            elif mode == "revision":
+                await _check_revision(conn)
+    finally:
+        await conn.close()
+    with startup_timer.stage("db_replicas"):
+        await replica_set.start()
+    logger.info("Database initialized", schema_check=mode)
+
+
+async def _check_revision(conn) -> None:
+    head = alembic_head()
+    row = (await conn.execute(text(
+        "SELECT to_regclass('alembic_version') IS NOT NULL, to_regclass('users') IS NOT NULL"
+    ))).one()
+    has_version_table, has_users = row
+    current = None
+    if has_version_table:
+        current = (await conn.execute(text("SELECT version_num FROM alembic_version"))).scalar()
+    if head is None:
+        if not has_users:
+            # no migrations in the tree yet: create the schema once on an empty database
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.commit()
+            logger.info("schema_bootstrapped")
+        return
+    if current != head:
+        logger.warning("schema_revision_mismatch", db=current, head=head)
+        if conf.db.require_head:
+            raise RuntimeError(f"database at revision {current}, code expects {head}: run alembic upgrade head")
 
 
 async def dispose_db():
+    await db_breaker.close()
+    await replica_set.stop()
+    if _engine is None:
+        return
     await _engine.dispose()
     logger.info("Database disposed")
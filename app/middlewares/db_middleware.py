@@ -67,16 +67,20 @@ from typing import Callable, Any, Awaitable
 from aiogram import BaseMiddleware
 
 from app.core.logger import get_logger
+from app.core.metrics import DB_COMMITS, DB_ROLLBACKS
+from app.db.instrumentation import profiler
 from app.db.lazy_session import LazySessionProxy
-from app.db.session import AsyncSessionLocal
+from app.db.session import AsyncSessionLocal, db_breaker, replica_set
 
 
 class DBSessionMiddleware(BaseMiddleware):
     async def __call__(self, handler: Callable[[Any, dict], Awaitable[Any]], event: Any, data: dict):
         request_id = data.get("request_id")
         logger = get_logger(request_id)
-        proxy = LazySessionProxy(session_maker=AsyncSessionLocal)
+        proxy = LazySessionProxy(session_maker=AsyncSessionLocal, replicas=replica_set, breaker=db_breaker)
         data["db"] = proxy
+        # count this update's statements against SQL_STATEMENT_BUDGET
+        sql_scope = profiler.begin_update() if profiler is not None else None
 
         try:
             result = await handler(event, data)
@@ -103,6 +107,7 @@ class DBSessionMiddleware(BaseMiddleware):
 
             if has_changes:
                 await session.commit()
+                DB_COMMITS.inc()
                 logger.info("DBSessionMiddleware: committed",
                             reason="writes_flag" if writes_flag else "session_new_dirty_deleted",
                             writes=writes_flag, new=len(session.new), dirty=len(session.dirty),
@@ -120,6 +125,7 @@ class DBSessionMiddleware(BaseMiddleware):
                 if session and not session.info.get("committed_by_handler"):
                     try:
                         await session.rollback()
+                        DB_ROLLBACKS.inc()
                         logger.info("DBSessionMiddleware: rolled back due to exception")
                     except Exception:
                         logger.exception("DBSessionMiddleware: rollback failed")
@@ -130,3 +136,8 @@ class DBSessionMiddleware(BaseMiddleware):
                     logger.exception("DBSessionMiddleware: session close failed")
             logger.exception("Exception in handler")
             raise
+        finally:
+            # releases the replica connection, if reads went to one
+            await proxy.close()
+            if sql_scope is not None:
+                profiler.end_update(sql_scope)
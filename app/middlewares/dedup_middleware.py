@@ -0,0 +1,104 @@
+# app/middlewares/dedup_middleware.py
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import Update
+
+from app.core.config import conf
+from app.core.logger import get_logger
+from app.core.metrics import UPDATES_DUPLICATE
+from app.utils.lang_cache import TTLCache
+from app.utils.redis_manager import RedisManager
+
+logger = get_logger()
+
+DEDUP_KEY = "update:{}:seen"
+# local TTLCache values and the Redis value once handled (redis-py encodes str on write)
+PROCESSING, DONE = "processing", "done"
+
+# delete the claim only if it is still ours (it may have lapsed and been taken over)
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+# Telegram redelivers webhook calls that timed out and a rolling restart can hand the same
+# updates to two instances. An update_id is claimed before the handler runs: in a local
+# window (same process, no I/O) and with SET NX in Redis (other instances). The claim is
+# "processing" with a short TTL and becomes "done" for UPDATE_DEDUP_TTL only once the
+# handler returned; if the handler fails or is cancelled it is released, and if the
+# instance dies it lapses, so a redelivered copy is handled instead of dropped.
+# If Redis is unavailable the update is processed - a rare duplicate beats a lost update.
+class UpdateDedupMiddleware(BaseMiddleware):
+    def __init__(self, ttl: Optional[int] = None, local_size: Optional[int] = None,
+                 processing_ttl: Optional[int] = None):
+        self.ttl = ttl or conf.bot.update_dedup_ttl
+        self.processing_ttl = processing_ttl or conf.bot.update_dedup_processing_ttl
+        self.seen = TTLCache(maxsize=local_size or conf.bot.update_dedup_local, ttl=self.ttl)
+        self.instance_id = uuid.uuid4().hex[:12]
+
+    async def __call__(self, handler: Callable[[Any, dict], Awaitable[Any]], event: Any, data: dict):
+        if not isinstance(event, Update):
+            return await handler(event, data)
+        update_id = event.update_id
+        if self.seen.get(update_id):
+            return self._drop(update_id, "local")
+        # claim locally before awaiting so a concurrent copy in this process is caught above
+        self.seen.set(update_id, PROCESSING, ttl=self.processing_ttl)
+        token = f"{self.instance_id}:{update_id}"
+        try:
+            claimed = await self._claim(update_id, token)
+        except BaseException:
+            self.seen.pop(update_id)
+            raise
+        if not claimed:
+            # another instance holds or finished it; our local entry just mirrors that
+            return self._drop(update_id, "redis")
+        try:
+            result = await handler(event, data)
+        except BaseException:
+            # failed or cancelled (shutdown deadline): let a redelivery run it again
+            self.seen.pop(update_id)
+            await self._release(update_id, token)
+            raise
+        self.seen.set(update_id, DONE)
+        await self._finish(update_id)
+        return result
+
+    async def _claim(self, update_id: int, token: str) -> bool:
+        redis = RedisManager.client()
+        if redis is None:
+            return True
+        try:
+            return bool(await redis.set(DEDUP_KEY.format(update_id), token, nx=True, ex=self.processing_ttl))
+        except Exception as e:
+            logger.warning("update_dedup_redis_failed", update_id=update_id, error=repr(e))
+            return True
+
+    async def _finish(self, update_id: int) -> None:
+        redis = RedisManager.client()
+        if redis is None:
+            return
+        try:
+            await redis.set(DEDUP_KEY.format(update_id), DONE, ex=self.ttl)
+        except Exception as e:
+            logger.warning("update_dedup_redis_failed", update_id=update_id, error=repr(e))
+
+    async def _release(self, update_id: int, token: str) -> None:
+        redis = RedisManager.client()
+        if redis is None:
+            return
+        try:
+            await redis.eval(RELEASE_SCRIPT, 1, DEDUP_KEY.format(update_id), token)
+        except Exception as e:
+            logger.warning("update_dedup_release_failed", update_id=update_id, error=repr(e))
+
+    def _drop(self, update_id: int, source: str):
+        UPDATES_DUPLICATE.labels(source).inc()
+        logger.info("update_duplicate", update_id=update_id, source=source)
+        return UNHANDLED
@@ -0,0 +1,16 @@
+# app/middlewares/fsm_prefetch_middleware.py
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+
+from app.utils.fsm_storage import reset_prefetched
+
+
+# aiogram's FSM middleware loads the state (and with it the prefetched data) before ours run;
+# this drops whatever the update left unconsumed, so the chat's next update can't read it
+class FSMPrefetchMiddleware(BaseMiddleware):
+    async def __call__(self, handler: Callable[[Any, dict], Awaitable[Any]], event: Any, data: dict):
+        try:
+            return await handler(event, data)
+        finally:
+            reset_prefetched()
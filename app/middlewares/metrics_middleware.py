@@ -0,0 +1,41 @@
+# app/middlewares/metrics_middleware.py
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from app.core.metrics import HANDLER_LATENCY, UPDATE_LATENCY, UPDATES_TOTAL
+from app.core.tracing import tracer
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler: Callable[[Any, dict], Awaitable[Any]], event: Any, data: dict):
+        update_type = "unknown"
+        if isinstance(event, Update):
+            try:
+                update_type = event.event_type
+            except Exception:
+                pass
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = await handler(event, data)
+            status = "ok"
+            return result
+        finally:
+            UPDATE_LATENCY.labels(update_type).observe(time.perf_counter() - start)
+            UPDATES_TOTAL.labels(update_type, status).inc()
+
+
+# inner middleware: registered on the dispatcher observers, applies to handlers of all routers
+class HandlerMetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler: Callable[[Any, dict], Awaitable[Any]], event: Any, data: dict):
+        handler_obj = data.get("handler")
+        name = getattr(getattr(handler_obj, "callback", None), "__name__", "unknown")
+        start = time.perf_counter()
+        try:
+            with tracer.span("handler", handler=name):
+                return await handler(event, data)
+        finally:
+            HANDLER_LATENCY.labels(name).observe(time.perf_counter() - start)
@@ -3,9 +3,16 @@ import uuid
 from aiogram import BaseMiddleware
 from typing import Callable, Any, Awaitable
 
+from app.core.logger import request_id_var
+
 class RequestIDMiddleware(BaseMiddleware):
     async def __call__(self, handler: Callable[[Any, dict], Awaitable[Any]], event: Any, data: dict):
         rid = uuid.uuid4().hex[:16]
         # bind to data for other middleware/handlers
         data["request_id"] = rid
-        return await handler(event, data)
+        # and to the context, for code below that only sees a session (SQL profiler)
+        token = request_id_var.set(rid)
+        try:
+            return await handler(event, data)
+        finally:
+            request_id_var.reset(token)
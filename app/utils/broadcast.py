@@ -0,0 +1,315 @@
+# app/utils/broadcast.py
+import asyncio
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from redis.exceptions import RedisError
+from sqlalchemy import select
+
+from app.bot.kb.translations import t
+from app.core.config import conf
+from app.core.logger import get_logger
+from app.core.metrics import BROADCAST_SENT
+from app.db.models import User
+from app.db.session import AsyncSessionLocal
+from app.utils.rate_limit import TokenBucket
+from app.utils.redis_manager import RedisManager
+
+logger = get_logger()
+
+ACTIVE_KEY = "broadcast:active"
+BLOCKED_KEY = "users:blocked"
+LOCK_TTL = 60
+REPORT_TTL = 7 * 24 * 3600
+RETRY_DELAY = 5.0
+
+Recipient = Tuple[int, int, Optional[str]]
+
+# refresh/delete the lock only while it still holds our token (it may have lapsed and been taken over)
+REFRESH_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class BroadcastUnavailable(Exception):
+    def __init__(self):
+        super().__init__("broadcasts need Redis, which is not connected")
+
+
+class LockLost(Exception):
+    # error: the refresh kept failing until the lock expired; None: another process holds it
+    def __init__(self, broadcast_id: str, error: Optional[BaseException] = None):
+        reason = f"could not be refreshed: {error!r}" if error is not None else "was taken over"
+        super().__init__(f"lock of broadcast {broadcast_id} {reason}")
+        self.broadcast_id = broadcast_id
+        self.error = error
+
+
+def _key(broadcast_id: str) -> str:
+    return f"broadcast:{broadcast_id}"
+
+
+def _lock_key(broadcast_id: str) -> str:
+    return f"broadcast:{broadcast_id}:lock"
+
+
+def _redis():
+    redis = RedisManager.client()
+    if redis is None:
+        raise BroadcastUnavailable()
+    return redis
+
+
+def _decode(raw: Dict) -> Dict[str, str]:
+    return {(k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in raw.items()}
+
+
+# Sends one translation key to every user. Rows are read in id order one window at a time,
+# keyset-resumed from the `last_id` checkpoint kept in the broadcast:{id} hash; the checkpoint
+# moves after each chunk, so a restart resends at most one chunk. Only one process runs a given
+# broadcast at a time (broadcast:{id}:lock holding its instance_id), the others just resume it
+# if that one dies. If Redis fails for longer than the lock TTL the run stops, marks the
+# broadcast "interrupted" and tells the admin; the next start resumes it. start/status/cancel
+# raise BroadcastUnavailable without Redis.
+class Broadcaster:
+    def __init__(self):
+        self.instance_id = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+        self._bot: Optional[Bot] = None
+        self._lock_ttl = LOCK_TTL
+        self._lock_expires = 0.0
+        self._admin: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, bot: Bot, text_key: str, admin_chat_id: int) -> str:
+        redis = _redis()
+        broadcast_id = uuid.uuid4().hex[:12]
+        if not await redis.set(ACTIVE_KEY, broadcast_id, nx=True):
+            raise RuntimeError("another broadcast is active")
+        await redis.hset(_key(broadcast_id), mapping={
+            "key": text_key, "admin": admin_chat_id, "status": "running", "last_id": 0,
+            "sent": 0, "blocked": 0, "failed": 0, "started_at": int(time.time()),
+        })
+        self._spawn(bot, broadcast_id)
+        return broadcast_id
+
+    async def resume(self, bot: Bot) -> None:
+        redis = RedisManager.client()
+        if redis is None or self.running:
+            return
+        broadcast_id = await redis.get(ACTIVE_KEY)
+        if broadcast_id:
+            self._spawn(bot, broadcast_id.decode())
+
+    async def cancel(self) -> Optional[str]:
+        # marks the active broadcast stopped; whichever process owns it stops after its current chunk
+        redis = _redis()
+        broadcast_id = await redis.get(ACTIVE_KEY)
+        if not broadcast_id:
+            return None
+        broadcast_id = broadcast_id.decode()
+        await redis.hset(_key(broadcast_id), "status", "stopped")
+        await redis.delete(ACTIVE_KEY)
+        return broadcast_id
+
+    async def status(self) -> Optional[Dict[str, str]]:
+        redis = _redis()
+        broadcast_id = await redis.get(ACTIVE_KEY)
+        if not broadcast_id:
+            return None
+        state = _decode(await redis.hgetall(_key(broadcast_id.decode())))
+        state["id"] = broadcast_id.decode()
+        return state
+
+    async def stop(self) -> None:
+        # process shutdown: the checkpoint is already in Redis, another start picks it up
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _spawn(self, bot: Bot, broadcast_id: str) -> None:
+        self._bot = bot
+        self._task = asyncio.create_task(self._run(broadcast_id))
+
+    async def _run(self, broadcast_id: str) -> None:
+        redis = RedisManager.client()
+        # the lock is refreshed once per chunk, so it must outlive sending one
+        self._lock_ttl = max(LOCK_TTL, int(2 * conf.broadcast.chunk / conf.broadcast.rate))
+        while True:
+            acquired_at = time.monotonic()
+            try:
+                if await redis.set(_lock_key(broadcast_id), self.instance_id, nx=True, ex=self._lock_ttl):
+                    break
+                # another process is on it; take over if its lock lapses while the broadcast is still active
+                await asyncio.sleep(LOCK_TTL)
+                if await redis.get(ACTIVE_KEY) != broadcast_id.encode():
+                    return
+            except (RedisError, OSError, asyncio.TimeoutError) as e:
+                logger.warning("broadcast_lock_failed", id=broadcast_id, error=repr(e), retry_in=RETRY_DELAY)
+                await asyncio.sleep(RETRY_DELAY)
+        self._lock_expires = acquired_at + self._lock_ttl
+        logger.info("broadcast_started", id=broadcast_id)
+        bucket = TokenBucket(rate=conf.broadcast.rate, capacity=1)
+        try:
+            while True:
+                try:
+                    if await self._run_window(redis, broadcast_id, bucket):
+                        break
+                except (asyncio.CancelledError, LockLost):
+                    raise
+                except Exception:
+                    logger.exception("broadcast_window_failed", id=broadcast_id, retry_in=RETRY_DELAY)
+                    await asyncio.sleep(RETRY_DELAY)
+        except LockLost as e:
+            if e.error is None:
+                # our lock lapsed (e.g. a Redis stall) and another process resumed from the checkpoint
+                logger.warning("broadcast_lock_lost", id=broadcast_id)
+            else:
+                await self._interrupt(redis, broadcast_id, e.error)
+            return
+        finally:
+            try:
+                await redis.eval(RELEASE_SCRIPT, 1, _lock_key(broadcast_id), self.instance_id)
+            except Exception as e:
+                # it expires on its own after the lock TTL
+                logger.warning("broadcast_unlock_failed", id=broadcast_id, error=repr(e))
+        await self._finish(redis, broadcast_id)
+
+    async def _refresh_lock(self, redis, broadcast_id: str) -> None:
+        # Redis errors are retried while the lock is still ours for sure; past its TTL another
+        # process may have taken over, so LockLost stops this one
+        while True:
+            sent_at = time.monotonic()
+            try:
+                refreshed = await redis.eval(REFRESH_SCRIPT, 1, _lock_key(broadcast_id), self.instance_id,
+                                             self._lock_ttl)
+            except (RedisError, OSError, asyncio.TimeoutError) as e:
+                remaining = self._lock_expires - time.monotonic()
+                if remaining <= 0:
+                    raise LockLost(broadcast_id, e) from e
+                retry_in = min(RETRY_DELAY, remaining)
+                logger.warning("broadcast_lock_refresh_failed", id=broadcast_id, error=repr(e),
+                               retry_in=round(retry_in, 2))
+                await asyncio.sleep(retry_in)
+                continue
+            if not refreshed:
+                raise LockLost(broadcast_id)
+            self._lock_expires = sent_at + self._lock_ttl
+            return
+
+    async def _interrupt(self, redis, broadcast_id: str, error: BaseException) -> None:
+        # left active: the next start (resume()) carries on from the checkpoint
+        logger.error("broadcast_interrupted", id=broadcast_id, error=repr(error))
+        try:
+            await redis.hset(_key(broadcast_id), mapping={"status": "interrupted", "error": repr(error)})
+        except Exception:
+            logger.warning("broadcast_status_failed", id=broadcast_id, exc_info=True)
+        try:
+            await self._bot.send_message(
+                self._admin or conf.admin,
+                f"Broadcast {broadcast_id} interrupted: Redis failed for longer than the lock TTL ({error!r}). "
+                f"It resumes from its checkpoint on the next start.",
+            )
+        except Exception:
+            logger.warning("broadcast_report_failed", id=broadcast_id, exc_info=True)
+
+    async def _run_window(self, redis, broadcast_id: str, bucket: TokenBucket) -> bool:
+        # the window is read up front and the session closed before sending: at BROADCAST_RATE
+        # a window takes minutes to send, far too long to keep a transaction open
+        state = _decode(await redis.hgetall(_key(broadcast_id)))
+        self._admin = int(state["admin"]) if state.get("admin") else None
+        if state.get("status") == "interrupted":
+            await redis.hset(_key(broadcast_id), "status", "running")
+            state["status"] = "running"
+        if state.get("status") != "running":
+            return True
+        last_id = int(state["last_id"])
+        stmt = (
+            select(User.id, User.chat_id, User.language)
+            .where(User.id > last_id)
+            .order_by(User.id)
+            .limit(conf.broadcast.window)
+        )
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(stmt)).all()
+        size = conf.broadcast.chunk
+        for i in range(0, len(rows), size):
+            await self._send_chunk(redis, broadcast_id, state["key"], rows[i:i + size], bucket)
+            if await redis.hget(_key(broadcast_id), "status") != b"running":
+                return True
+        return len(rows) < conf.broadcast.window
+
+    async def _send_chunk(self, redis, broadcast_id: str, text_key: str, chunk: List[Recipient],
+                          bucket: TokenBucket) -> None:
+        results = await asyncio.gather(*(self._send_one(bucket, chat_id, lang, text_key)
+                                         for _, chat_id, lang in chunk))
+        blocked = [chat_id for (_, chat_id, _), status in zip(chunk, results) if status == "blocked"]
+        # refresh the lock before moving the checkpoint, so a process that lost it doesn't
+        # overwrite the new owner's progress
+        await self._refresh_lock(redis, broadcast_id)
+        key = _key(broadcast_id)
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, "last_id", chunk[-1][0])
+            pipe.hincrby(key, "sent", results.count("sent"))
+            pipe.hincrby(key, "blocked", len(blocked))
+            pipe.hincrby(key, "failed", results.count("failed"))
+            if blocked:
+                pipe.sadd(BLOCKED_KEY, *blocked)
+            await pipe.execute()
+
+    async def _send_one(self, bucket: TokenBucket, chat_id: int, lang: Optional[str], text_key: str) -> str:
+        await bucket.acquire()
+        try:
+            await self._bot.send_message(chat_id, t(lang or "en", text_key))
+            status = "sent"
+        except TelegramForbiddenError:
+            status = "blocked"
+        except TelegramBadRequest:
+            status = "failed"
+        except Exception:
+            logger.warning("broadcast_send_failed", chat_id=chat_id, exc_info=True)
+            status = "failed"
+        BROADCAST_SENT.labels(status).inc()
+        return status
+
+    async def _finish(self, redis, broadcast_id: str) -> None:
+        key = _key(broadcast_id)
+        state = _decode(await redis.hgetall(key))
+        if state.get("status") == "running":
+            await redis.hset(key, "status", "done")
+            state["status"] = "done"
+        await redis.expire(key, REPORT_TTL)
+        if await redis.get(ACTIVE_KEY) == broadcast_id.encode():
+            await redis.delete(ACTIVE_KEY)
+        logger.info("broadcast_finished", id=broadcast_id, **state)
+        try:
+            await self._bot.send_message(
+                int(state["admin"]),
+                f"Broadcast {broadcast_id} {state.get('status')}: sent {state['sent']}, "
+                f"blocked {state['blocked']}, failed {state['failed']}",
+            )
+        except Exception:
+            logger.warning("broadcast_report_failed", id=broadcast_id, exc_info=True)
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,103 @@
+# app/utils/circuit_breaker.py
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+from app.core.config import conf
+from app.core.logger import get_logger
+from app.core.metrics import BREAKER_REJECTED, BREAKER_STATE
+
+logger = get_logger()
+
+CLOSED, OPEN = 0, 1
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str):
+        super().__init__(f"{name} circuit is open")
+        self.name = name
+
+
+# Opens after `failure_threshold` consecutive failures. While open every call fails fast
+# with CircuitOpenError, and a background task runs `probe` every `probe_interval` seconds;
+# the first successful probe closes the circuit again. Real traffic is never used as a probe.
+class CircuitBreaker:
+    def __init__(self, name: str, probe: Callable[[], Awaitable[object]], failure_threshold: int,
+                 probe_interval: float, probe_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self._probe = probe
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_task: Optional[asyncio.Task] = None
+        BREAKER_STATE.labels(name).set(CLOSED)
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN
+
+    def check(self) -> None:
+        if self.state == OPEN:
+            BREAKER_REJECTED.labels(self.name).inc()
+            raise CircuitOpenError(self.name)
+
+    def success(self) -> None:
+        self.failures = 0
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open()
+
+    def stats(self) -> dict:
+        return {"state": "open" if self.is_open else "closed", "failures": self.failures,
+                "open_for": round(time.monotonic() - self.opened_at, 1) if self.opened_at else 0}
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        BREAKER_STATE.labels(self.name).set(OPEN)
+        logger.error("circuit_opened", breaker=self.name, failures=self.failures)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = loop.create_task(self._probe_loop())
+
+    def _close(self) -> None:
+        logger.info("circuit_closed", breaker=self.name, open_for=round(time.monotonic() - self.opened_at, 1))
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        BREAKER_STATE.labels(self.name).set(CLOSED)
+
+    async def _probe_loop(self) -> None:
+        while self.state == OPEN:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                async with asyncio.timeout(self.probe_timeout):
+                    await self._probe()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("circuit_probe_failed", breaker=self.name, error=repr(e))
+                continue
+            self._close()
+
+    async def close(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+
+
+def make_breaker(name: str, probe: Callable[[], Awaitable[object]], probe_timeout: float) -> CircuitBreaker:
+    return CircuitBreaker(name, probe, failure_threshold=conf.breaker.failures,
+                          probe_interval=conf.breaker.probe_interval, probe_timeout=probe_timeout)
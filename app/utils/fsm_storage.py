@@ -0,0 +1,114 @@
+# app/utils/fsm_storage.py
+from contextvars import ContextVar
+from typing import Any, Dict, Mapping, Optional
+
+import orjson
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from app.core.config import conf
+from app.core.logger import get_logger
+from app.utils.redis_manager import RedisManager
+
+logger = get_logger()
+
+# data fetched together with the state; consumed once by the next get_data() of the same update.
+# ChatScheduler runs a chat's updates one after another in one task, so FSMPrefetchMiddleware
+# resets it when each update ends.
+_prefetched: ContextVar[Optional[Dict[str, Optional[bytes]]]] = ContextVar("fsm_prefetched", default=None)
+
+
+def reset_prefetched() -> None:
+    _prefetched.set(None)
+
+
+# State and data live in two keys with their own TTLs (REDIS_TTL_STATE / REDIS_TTL_DATA).
+# get_state() reads both with one MGET, so a later get_data() in the same update is free.
+# Falls back to MemoryStorage while Redis is not initialized or failing.
+class RedisFSMStorage(BaseStorage):
+    def __init__(self, key_builder: Optional[KeyBuilder] = None,
+                 state_ttl: Optional[int] = None, data_ttl: Optional[int] = None):
+        self.key_builder = key_builder or DefaultKeyBuilder(prefix="fsm", with_bot_id=True)
+        self.state_ttl = state_ttl if state_ttl is not None else conf.redis.ttl_state
+        self.data_ttl = data_ttl if data_ttl is not None else conf.redis.ttl_data
+        self._fallback = MemoryStorage()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        redis = RedisManager.client()
+        if redis is None:
+            return await self._fallback.set_state(key, state)
+        value = state.state if isinstance(state, State) else state
+        redis_key = self.key_builder.build(key, "state")
+        try:
+            if value is None:
+                await redis.delete(redis_key)
+            else:
+                await redis.set(redis_key, value, ex=self.state_ttl or None)
+        except Exception:
+            logger.warning("fsm_set_state_failed", key=redis_key, exc_info=True)
+            await self._fallback.set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        # a fallback read must not leave an older prefetch behind for get_data()
+        reset_prefetched()
+        redis = RedisManager.client()
+        if redis is None:
+            return await self._fallback.get_state(key)
+        state_key = self.key_builder.build(key, "state")
+        data_key = self.key_builder.build(key, "data")
+        try:
+            state, data = await redis.mget(state_key, data_key)
+        except Exception:
+            logger.warning("fsm_get_state_failed", key=state_key, exc_info=True)
+            return await self._fallback.get_state(key)
+        _prefetched.set({data_key: data})
+        if isinstance(state, bytes):
+            return state.decode("utf-8")
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        redis = RedisManager.client()
+        if redis is None:
+            return await self._fallback.set_data(key, data)
+        redis_key = self.key_builder.build(key, "data")
+        self._drop_prefetched(redis_key)
+        try:
+            if not data:
+                await redis.delete(redis_key)
+            else:
+                await redis.set(redis_key, orjson.dumps(data), ex=self.data_ttl or None)
+        except Exception:
+            logger.warning("fsm_set_data_failed", key=redis_key, exc_info=True)
+            await self._fallback.set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        redis = RedisManager.client()
+        if redis is None:
+            return await self._fallback.get_data(key)
+        redis_key = self.key_builder.build(key, "data")
+        prefetched = _prefetched.get()
+        if prefetched is not None and redis_key in prefetched:
+            raw = prefetched.pop(redis_key)
+        else:
+            try:
+                raw = await redis.get(redis_key)
+            except Exception:
+                logger.warning("fsm_get_data_failed", key=redis_key, exc_info=True)
+                return await self._fallback.get_data(key)
+        if raw is None:
+            return {}
+        return orjson.loads(raw)
+
+    async def close(self) -> None:
+        # the Redis client is owned by RedisManager and closed in shutdown()
+        await self._fallback.close()
+
+    @staticmethod
+    def _drop_prefetched(redis_key: str) -> None:
+        prefetched = _prefetched.get()
+        if prefetched is not None:
+            prefetched.pop(redis_key, None)
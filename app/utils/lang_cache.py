@@ -0,0 +1,140 @@
+# app/utils/lang_cache.py
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from app.core.config import conf
+from app.core.logger import get_logger
+from app.utils.redis_manager import RedisManager
+
+logger = get_logger()
+
+INVALIDATE_CHANNEL = "user:lang:invalidate"
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+# In-process tier in front of Redis for user:{chat_id}:lang and user:{chat_id}:profile. Writers
+# publish the chat_id on INVALIDATE_CHANNEL so every other replica drops its local copies.
+class LangCache:
+    def __init__(self, maxsize: int, ttl: float, profile_size: int = 0):
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        # separate LRU: profiles must not push language entries out
+        self.profiles = TTLCache(maxsize=profile_size, ttl=ttl)
+        self.instance_id = uuid.uuid4().hex[:12]
+        self._listener: Optional[asyncio.Task] = None
+
+    def get(self, chat_id: int) -> Optional[str]:
+        return self.local.get(chat_id)
+
+    def set(self, chat_id: int, lang: str, ttl: Optional[float] = None) -> None:
+        self.local.set(chat_id, lang, ttl=ttl)
+
+    # (user_id, language, fingerprint) from user:{chat_id}:profile, same invalidation as the language
+    def get_profile(self, chat_id: int) -> Optional[tuple]:
+        return self.profiles.get(chat_id)
+
+    def set_profile(self, chat_id: int, profile: tuple) -> None:
+        self.profiles.set(chat_id, profile)
+
+    def pop_profile(self, chat_id: int) -> None:
+        self.profiles.pop(chat_id)
+
+    def invalidate(self, chat_id: int) -> None:
+        self.local.pop(chat_id)
+        self.pop_profile(chat_id)
+
+    async def publish_invalidate(self, redis_client, chat_id: int) -> None:
+        if redis_client is None:
+            return
+        try:
+            await redis_client.publish(INVALIDATE_CHANNEL, f"{self.instance_id}:{chat_id}")
+        except Exception:
+            logger.warning("lang_cache_publish_failed", chat_id=chat_id)
+
+    async def start(self) -> None:
+        if self._listener is None and (self.local.maxsize > 0 or self.profiles.maxsize > 0):
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is None:
+            return
+        self._listener.cancel()
+        try:
+            await self._listener
+        except asyncio.CancelledError:
+            pass
+        self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            redis = RedisManager.client()
+            if redis is None:
+                await asyncio.sleep(1)
+                continue
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATE_CHANNEL)
+                # entries may have changed while we were not subscribed
+                self.local.clear()
+                self.profiles.clear()
+                async for msg in pubsub.listen():
+                    if msg.get("type") == "message":
+                        self._on_message(msg.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("lang_cache_listener_failed", exc_info=True)
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def _on_message(self, data) -> None:
+        if isinstance(data, bytes):
+            data = data.decode("utf-8", errors="ignore")
+        origin, _, chat_id = str(data).partition(":")
+        if origin == self.instance_id:
+            return
+        try:
+            self.invalidate(int(chat_id))
+        except ValueError:
+            logger.warning("lang_cache_bad_message", data=data)
+
+
+lang_cache = LangCache(maxsize=conf.cache.lang_size, ttl=conf.cache.lang_ttl, profile_size=conf.cache.profile_size)
@@ -0,0 +1,171 @@
+# app/utils/polling.py
+import asyncio
+import random
+import time
+from typing import Optional, Set, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import GetUpdates
+from aiogram.types import Update
+
+from app.core.config import conf
+from app.core.logger import get_logger
+from app.core.metrics import POLLING_BUFFERED, POLLING_LAG
+from app.utils.redis_manager import RedisManager
+from app.utils.scheduler import ChatScheduler, chat_key
+
+logger = get_logger()
+
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 30.0
+
+OFFSET_KEY = "polling:{}:offset"
+
+
+async def load_offset(bot: Bot) -> Optional[int]:
+    redis = RedisManager.client()
+    if redis is None:
+        return None
+    try:
+        raw = await redis.get(OFFSET_KEY.format(bot.id))
+    except Exception as e:
+        logger.warning("polling_offset_load_failed", error=repr(e))
+        return None
+    return int(raw) if raw is not None else None
+
+
+async def prepare_polling(bot: Bot) -> Optional[int]:
+    # Keeps the updates queued while we were down. If the backlog is longer than
+    # POLLING_BACKLOG_MAX, everything but the newest ones is dropped (negative offset)
+    # and the returned offset is None; otherwise the offset saved by the last process.
+    await bot.delete_webhook(drop_pending_updates=False)
+    cap = conf.polling.backlog_max
+    if cap > 0:
+        pending = (await bot.get_webhook_info()).pending_update_count
+        if pending > cap:
+            await bot(GetUpdates(offset=-cap, limit=1, timeout=0))
+            logger.warning("polling_backlog_skipped", pending=pending, kept=cap)
+            return None
+    offset = await load_offset(bot)
+    logger.info("polling_resume", offset=offset)
+    return offset
+
+
+# getUpdates loop that hands every update to the ChatScheduler instead of aiogram's
+# start_polling, so ordering per chat and the concurrency limit are ours. Fetching and
+# dispatching are separate tasks joined by a bounded buffer: the next long poll goes out as
+# soon as a batch is buffered, and only a full buffer makes the fetcher wait.
+#
+# Telegram forgets an update only when a later getUpdates asks for a higher offset, so the
+# poller never asks for more than `committed` (the lowest update still buffered or running):
+# an update cancelled at shutdown or left in the buffer is still on Telegram's side. Telegram
+# then returns the in-flight updates again; ids below `offset` (already fetched) are skipped,
+# and a batch with nothing new waits until an update finishes, so at most POLLING_LIMIT
+# updates are fetched past the oldest unfinished one. `committed` is also saved in
+# Redis for the next process, which gets those updates again (the update dedup drops the ones
+# that did finish).
+class Poller:
+    def __init__(self, bot: Bot, dp: Dispatcher, scheduler: ChatScheduler, offset: Optional[int] = None):
+        self.bot = bot
+        self.dp = dp
+        self.scheduler = scheduler
+        self.offset: Optional[int] = offset
+        self.limit = conf.polling.limit
+        self.timeout = conf.polling.timeout
+        self._buffer: "asyncio.Queue[Tuple[Update, float]]" = asyncio.Queue(maxsize=conf.polling.buffer)
+        self._running: Set[int] = set()
+        self._saved: Optional[int] = offset
+        self._stopped = asyncio.Event()
+        self._progress = asyncio.Event()
+        self._fetcher: Optional[asyncio.Task] = None
+        POLLING_BUFFERED.set_function(self._buffer.qsize)
+
+    @property
+    def committed(self) -> Optional[int]:
+        return min(self._running) if self._running else self.offset
+
+    def stop(self) -> None:
+        # fetching stops right away, before the scheduler is drained; run() is cancelled after
+        # this and whatever is still buffered is not fed (it was never confirmed to Telegram)
+        self._stopped.set()
+        if self._fetcher is not None:
+            self._fetcher.cancel()
+
+    async def run(self) -> None:
+        self._fetcher = fetcher = asyncio.create_task(self._fetch())
+        try:
+            while True:
+                update, fetched_at = await self._buffer.get()
+                await self.scheduler.submit(chat_key(update), self._feed(update, fetched_at))
+        finally:
+            fetcher.cancel()
+            try:
+                await fetcher
+            except asyncio.CancelledError:
+                pass
+            if not self._buffer.empty():
+                logger.info("polling_buffer_left", updates=self._buffer.qsize(), committed=self.committed)
+
+    async def _fetch(self) -> None:
+        allowed_updates = self.dp.resolve_used_update_types()
+        request_timeout = int(self.bot.session.timeout + self.timeout)
+        delay = RETRY_DELAY
+        while not self._stopped.is_set():
+            method = GetUpdates(offset=self.committed, limit=self.limit, timeout=self.timeout,
+                                allowed_updates=allowed_updates)
+            self._progress.clear()
+            try:
+                updates = await self.bot(method, request_timeout=request_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # jittered so instances that lost the network together don't retry in lockstep
+                sleep = random.uniform(delay / 2, delay)
+                logger.warning("get_updates failed", retry_in=round(sleep, 2), exc_info=True)
+                await asyncio.sleep(sleep)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                continue
+            delay = RETRY_DELAY
+            fetched_at = time.perf_counter()
+            new = [u for u in updates if self.offset is None or u.update_id >= self.offset]
+            for update in new:
+                self.offset = update.update_id + 1
+                self._running.add(update.update_id)
+                await self._buffer.put((update, fetched_at))
+            await self.save_offset()
+            if updates and not new:
+                # the whole batch is still in flight: polling again would return it right away
+                await self._progress.wait()
+
+    async def save_offset(self) -> None:
+        offset = self.committed
+        if offset is None or offset == self._saved:
+            return
+        redis = RedisManager.client()
+        if redis is None:
+            return
+        try:
+            await redis.set(OFFSET_KEY.format(self.bot.id), offset)
+        except Exception as e:
+            logger.warning("polling_offset_save_failed", offset=offset, error=repr(e))
+            return
+        self._saved = offset
+
+    def _feed(self, update: Update, fetched_at: float):
+        async def job():
+            POLLING_LAG.observe(time.perf_counter() - fetched_at)
+            try:
+                result = await self.dp.feed_update(self.bot, update)
+            except Exception:
+                # handled, even if unsuccessfully: redelivering it would fail the same way
+                self._done(update.update_id)
+                raise
+            # a CancelledError (drain deadline at shutdown) leaves it running, so the offset
+            # confirmed to Telegram and the saved one stay below it and it is fetched again
+            self._done(update.update_id)
+            return result
+        return job
+
+    def _done(self, update_id: int) -> None:
+        self._running.discard(update_id)
+        self._progress.set()
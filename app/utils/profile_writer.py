@@ -0,0 +1,164 @@
+# app/utils/profile_writer.py
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import conf
+from app.core.logger import get_logger
+from app.core.metrics import PROFILE_WRITES_DROPPED
+from app.db.models import User, utc_now
+from app.db.session import AsyncSessionLocal, db_breaker
+
+logger = get_logger()
+
+# rows per INSERT; asyncpg caps a statement at 32767 bind parameters
+CHUNK_SIZE = 1000
+
+Profile = Tuple[Optional[str], Optional[str], Optional[bool]]
+OnFlushed = Callable[[], Awaitable[None]]
+
+
+# Collects username/first_name/is_premium refreshes and writes them as multi-row upserts.
+# Only the newest profile per chat_id is kept; a flush runs every `interval` seconds,
+# as soon as `max_size` chats are pending, and once more from stop(). An `on_flushed`
+# callback runs only after its row was committed (e.g. to mark the profile cache fresh).
+# While Postgres fails, at most `max_pending` chats are kept and a row is dropped after
+# `max_retries` failed flushes; its callback never runs, so the next /start re-queues it.
+class ProfileWriteBuffer:
+    def __init__(self, max_size: int, interval: float, max_pending: int = 0, max_retries: int = 0):
+        self.max_size = max_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self._pending: Dict[int, Profile] = {}
+        self._on_flushed: Dict[int, OnFlushed] = {}
+        self._attempts: Dict[int, int] = {}
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, chat_id: int, username: Optional[str], first_name: Optional[str],
+            is_premium: Optional[bool], on_flushed: Optional[OnFlushed] = None) -> None:
+        if chat_id not in self._pending and self._full():
+            PROFILE_WRITES_DROPPED.labels("full").inc()
+            return
+        self._pending[chat_id] = (username, first_name, is_premium)
+        # newer data: its retry budget starts over
+        self._attempts.pop(chat_id, None)
+        if on_flushed is not None:
+            self._on_flushed[chat_id] = on_flushed
+        else:
+            self._on_flushed.pop(chat_id, None)
+        if len(self._pending) >= self.max_size:
+            self._wakeup.set()
+
+    def _full(self) -> bool:
+        return bool(self.max_pending) and len(self._pending) >= self.max_pending
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("profile_flush_failed", lost=len(self._pending))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("profile_flush_failed")
+
+    async def flush(self) -> int:
+        async with self._lock:
+            if not self._pending or db_breaker.is_open:
+                # Postgres is down: keep the profiles for a flush after it recovers
+                return 0
+            batch, self._pending = self._pending, {}
+            callbacks, self._on_flushed = self._on_flushed, {}
+            attempts, self._attempts = self._attempts, {}
+            # fixed row order keeps concurrent flushes from different replicas deadlock-free
+            chat_ids = sorted(batch)
+            now = utc_now()
+            try:
+                async with AsyncSessionLocal() as session:
+                    for i in range(0, len(chat_ids), CHUNK_SIZE):
+                        rows = [
+                            dict(chat_id=cid, username=batch[cid][0], first_name=batch[cid][1],
+                                 is_premium=batch[cid][2], created_at=now)
+                            for cid in chat_ids[i:i + CHUNK_SIZE]
+                        ]
+                        await session.execute(_upsert_profiles(rows))
+                    await session.commit()
+            except Exception:
+                # keep anything newer that arrived meanwhile, retry the rest on the next flush
+                dropped = 0
+                for cid, profile in batch.items():
+                    if cid in self._pending:
+                        continue
+                    failures = attempts.get(cid, 0) + 1
+                    if (self.max_retries and failures >= self.max_retries) or self._full():
+                        dropped += 1
+                        continue
+                    self._pending[cid] = profile
+                    self._attempts[cid] = failures
+                    if cid in callbacks:
+                        self._on_flushed[cid] = callbacks[cid]
+                if dropped:
+                    PROFILE_WRITES_DROPPED.labels("retries").inc(dropped)
+                    logger.warning("profile_flush_dropped", rows=dropped, pending=len(self._pending))
+                raise
+            logger.info("profile_flush", rows=len(chat_ids))
+        await self._run_callbacks(callbacks)
+        return len(chat_ids)
+
+    async def _run_callbacks(self, callbacks: Dict[int, OnFlushed]) -> None:
+        if not callbacks:
+            return
+        results = await asyncio.gather(*(cb() for cb in callbacks.values()), return_exceptions=True)
+        for cid, result in zip(callbacks, results):
+            if isinstance(result, Exception):
+                logger.warning("profile_on_flushed_failed", chat_id=cid, error=repr(result))
+
+
+def _upsert_profiles(rows):
+    ins = pg_insert(User).values(rows)
+    return ins.on_conflict_do_update(
+        index_elements=[User.chat_id],
+        set_={
+            "username": ins.excluded.username,
+            "first_name": ins.excluded.first_name,
+            "is_premium": ins.excluded.is_premium,
+        },
+        where=or_(
+            User.username.is_distinct_from(ins.excluded.username),
+            User.first_name.is_distinct_from(ins.excluded.first_name),
+            User.is_premium.is_distinct_from(ins.excluded.is_premium),
+        )
+    )
+
+
+profile_buffer = ProfileWriteBuffer(
+    max_size=conf.db.profile_flush_size, interval=conf.db.profile_flush_interval,
+    max_pending=conf.db.profile_max_pending, max_retries=conf.db.profile_max_retries,
+)
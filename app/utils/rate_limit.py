@@ -0,0 +1,128 @@
+# app/utils/rate_limit.py
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self._tokens >= self.capacity
+
+    def reserve(self) -> float:
+        # takes a token now (possibly going negative) and returns how long the caller must wait
+        self._refill()
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def pause(self, seconds: float) -> None:
+        # server asked this key to back off: the next reserve() waits at least `seconds`
+        self._refill()
+        self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+    async def acquire(self) -> float:
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+
+# Token bucket with a waiting line ordered by priority (lower first), then arrival.
+# A single pump task hands out tokens, so high-priority callers overtake queued ones.
+class PriorityLimiter:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiters)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float) -> None:
+        # server asked us to back off (429 retry_after): nothing goes out until it passes
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = min(self._tokens, 0)
+
+    async def acquire(self, priority: int = 1) -> float:
+        self._refill()
+        if not self._waiters and self._tokens >= 1 and time.monotonic() >= self._paused_until:
+            self._tokens -= 1
+            return 0.0
+        start = time.monotonic()
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run_pump())
+        await fut
+        return time.monotonic() - start
+
+    async def _run_pump(self) -> None:
+        while self._waiters:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():
+                # caller was cancelled while waiting
+                continue
+            self._tokens -= 1
+            fut.set_result(None)
+
+
+class KeyedBuckets:
+    def __init__(self, max_keys: int = 10_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def get(self, key: Hashable, rate: float, capacity: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+            self._evict()
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _evict(self) -> None:
+        # drop least recently used buckets; a full bucket carries no state worth keeping
+        while len(self._buckets) > self.max_keys:
+            key, bucket = next(iter(self._buckets.items()))
+            self._buckets.pop(key)
+            if not bucket.full:
+                # still throttling: keep it, stop evicting for now
+                self._buckets[key] = bucket
+                break
@@ -0,0 +1,62 @@
+# app/utils/redis_batch.py
+import asyncio
+from typing import Dict, List, Optional
+
+from app.core.logger import get_logger
+from app.core.metrics import REDIS_BATCH_SIZE
+
+logger = get_logger()
+
+
+# Coalesces GETs issued by concurrent tasks into one MGET. Keys requested during the same
+# event-loop tick (window=0) or within `window` seconds are sent together; a batch is sent
+# early once it holds `max_keys` distinct keys. Duplicate keys share one slot in the MGET.
+class GetBatcher:
+    def __init__(self, client, window: float = 0.0, max_keys: int = 256):
+        self.client = client
+        self.window = window
+        self.max_keys = max_keys
+        self._pending: Dict[object, List[asyncio.Future]] = {}
+        self._handle: Optional[asyncio.Handle] = None
+
+    async def get(self, key):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.setdefault(key, []).append(fut)
+        if len(self._pending) >= self.max_keys:
+            self._flush()
+        elif self._handle is None:
+            if self.window > 0:
+                self._handle = loop.call_later(self.window, self._flush)
+            else:
+                self._handle = loop.call_soon(self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        asyncio.create_task(self._send(batch))
+
+    async def _send(self, batch: Dict[object, List[asyncio.Future]]) -> None:
+        keys = list(batch)
+        REDIS_BATCH_SIZE.observe(len(keys))
+        try:
+            if len(keys) == 1:
+                values = [await self.client.execute_command("GET", keys[0])]
+            else:
+                values = await self.client.mget(keys)
+        except Exception as e:
+            for waiters in batch.values():
+                for fut in waiters:
+                    if not fut.done():
+                        fut.set_exception(e)
+            return
+        for key, value in zip(keys, values):
+            for fut in batch[key]:
+                # waiter may have been cancelled meanwhile
+                if not fut.done():
+                    fut.set_result(value)
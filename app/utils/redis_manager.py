@@ -1,11 +1,59 @@
 # app/utils/redis_manager.py
-from redis.asyncio import from_url, Redis
+import asyncio
+import time
+from typing import Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
 
 from app.core.config import conf
 from app.core.logger import get_logger
+from app.core.metrics import REDIS_LATENCY
+from app.core.tracing import tracer
+from app.utils.circuit_breaker import CircuitBreaker, make_breaker
+from app.utils.redis_batch import GetBatcher
 
 logger = get_logger()
 
+# errors that mean "Redis is unavailable" (not e.g. WRONGTYPE) and count towards the breaker
+UNAVAILABLE_ERRORS = (RedisConnectionError, RedisTimeoutError, OSError, asyncio.TimeoutError)
+
+
+class InstrumentedRedis(Redis):
+    # set by RedisManager.init: GET coalescing (REDIS_BATCH_GETS), per-command time budget, breaker
+    batcher: Optional[GetBatcher] = None
+    timeout: Optional[float] = None
+    breaker: Optional[CircuitBreaker] = None
+
+    async def get(self, name):
+        if self.batcher is None:
+            return await super().get(name)
+        return await self.batcher.get(name)
+
+    async def execute_command(self, *args, **options):
+        breaker = self.breaker
+        if breaker is not None:
+            breaker.check()
+        command = str(args[0]).upper() if args else "unknown"
+        start = time.perf_counter()
+        try:
+            with tracer.span("redis", command=command):
+                async with asyncio.timeout(self.timeout):
+                    result = await super().execute_command(*args, **options)
+        except UNAVAILABLE_ERRORS:
+            if breaker is not None:
+                breaker.failure()
+            raise
+        finally:
+            REDIS_LATENCY.labels(command).observe(time.perf_counter() - start)
+        if breaker is not None:
+            breaker.success()
+        return result
+
+    async def probe(self):
+        # bypasses the breaker: used by it to detect recovery
+        return await Redis.execute_command(self, "PING")
+
 
 class RedisManager:
     _client: Redis | None = None
@@ -15,7 +63,13 @@ class RedisManager:
         if cls._client:
             return cls._client
         url = conf.redis.url_or_build()
-        cls._client = from_url(url, decode_responses=False)
+        cls._client = InstrumentedRedis.from_url(url, decode_responses=False,
+                                                 socket_connect_timeout=conf.redis.timeout)
+        cls._client.timeout = conf.redis.timeout
+        cls._client.breaker = make_breaker("redis", cls._client.probe, probe_timeout=conf.redis.timeout)
+        if conf.redis.batch_gets:
+            cls._client.batcher = GetBatcher(cls._client, window=conf.redis.batch_window_ms / 1000,
+                                             max_keys=conf.redis.batch_max_keys)
         try:
             await cls._client.ping()
             logger.info("Redis client initialized")
@@ -31,6 +85,7 @@ class RedisManager:
     @classmethod
     async def close(cls):
         if cls._client:
+            await cls._client.breaker.close()
             try:
                 await cls._client.close()
             except Exception:
@@ -1,39 +1,48 @@
 # run_local.py
 import asyncio
 
-from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
-
-from app.bot.handlers import start as start_pkg, callbacks as cb_pkg, lang_cmd as lang_pkg
-from app.middlewares.db_middleware import DBSessionMiddleware
-from app.middlewares.request_id_middleware import RequestIDMiddleware
-from app.core.config import conf
+from aiogram.methods import GetUpdates
+
+from app.bot.dispatcher import create_bot, create_dispatcher
+from app.bot.kb.translations import catalog
 from app.core.logger import get_logger
+from app.core.tracing import tracer
 from app.db.session import init_db
+from app.utils.broadcast import broadcaster
+from app.utils.lang_cache import lang_cache
+from app.utils.polling import prepare_polling
+from app.utils.profile_writer import profile_buffer
 from app.utils.redis_manager import RedisManager
 
 logger = get_logger()
 
 
 async def run_local():
-    bot = Bot(token=conf.bot.token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    dp = Dispatcher()
-    dp.update.outer_middleware(RequestIDMiddleware())
-    dp.update.outer_middleware(DBSessionMiddleware())
-    dp.include_router(start_pkg.router)
-    dp.include_router(cb_pkg.router)
-    dp.include_router(lang_pkg.router)
+    bot = create_bot()
+    dp = create_dispatcher()
 
     await RedisManager.init()
+    await lang_cache.start()
+    await catalog.start()
     await init_db()
-
-    await bot.delete_webhook(drop_pending_updates=True)
+    await profile_buffer.start()
+    await tracer.start()
+    await broadcaster.resume(bot)
+
+    offset = await prepare_polling(bot)
+    if offset is not None:
+        # aiogram's polling keeps its own offset: confirm what the last process already handled
+        await bot(GetUpdates(offset=offset, limit=1, timeout=0))
     try:
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
+        await broadcaster.stop()
         await bot.session.close()
+        await profile_buffer.stop()
+        await catalog.stop()
+        await lang_cache.stop()
         await RedisManager.close()
+        await tracer.stop()
 
 
 if __name__ == "__main__":
@@ -1,54 +1,133 @@
 # run_webhook.py
-from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
+import asyncio
+import hmac
+from typing import Optional
+
+import orjson
+from aiogram import Bot
+from aiogram.types import Update
 from aiohttp import web
 
-from app.bot.handlers import start as start_pkg, callbacks as cb_pkg, lang_cmd as lang_pkg
-from app.middlewares.db_middleware import DBSessionMiddleware
-from app.middlewares.request_id_middleware import RequestIDMiddleware
+from app.bot.dispatcher import create_bot, create_dispatcher
+from app.bot.kb.translations import catalog
 from app.core.config import conf
 from app.core.logger import get_logger
-from app.db.session import init_db
+from app.core.metrics import add_metrics_route, start_metrics_server, stop_metrics_server
+from app.core.startup import startup_timer
+from app.core.tracing import tracer
+from app.db.session import init_db, dispose_db
+from app.utils.broadcast import broadcaster
+from app.utils.lang_cache import lang_cache
+from app.utils.profile_writer import profile_buffer
 from app.utils.redis_manager import RedisManager
+from app.utils.scheduler import update_scheduler, chat_key
 
 logger = get_logger()
 
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+async def handle_update(request: web.Request) -> web.Response:
+    app = request.app
+    secret = conf.webhook.secret
+    if secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+        logger.warning("webhook_bad_secret", remote=request.remote)
+        return web.Response(status=401)
+
+    if update_scheduler.in_flight >= conf.webhook.max_tasks:
+        # non-2xx makes Telegram redeliver later instead of us queueing without bound
+        logger.warning("webhook_backpressure", **update_scheduler.stats())
+        return web.Response(status=503)
 
-async def create_app():
-    bot = Bot(token=conf.bot.token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    dp = Dispatcher()
-    dp.update.outer_middleware(RequestIDMiddleware())
-    dp.update.outer_middleware(DBSessionMiddleware())
-    dp.include_router(start_pkg.router)
-    dp.include_router(cb_pkg.router)
-    dp.include_router(lang_pkg.router)
+    bot: Bot = app["bot"]
+    try:
+        update = Update.model_validate(orjson.loads(await request.read()), context={"bot": bot})
+    except Exception:
+        logger.warning("webhook_bad_payload", exc_info=True)
+        return web.Response(status=400)
 
-    await RedisManager.init()
-    await init_db()
+    dp = app["dp"]
 
-    # set webhook
+    async def job():
+        return await dp.feed_update(bot, update)
+
+    # per-chat ordering: a chat's updates run one by one, other chats in parallel
+    await update_scheduler.submit(chat_key(update), job)
+    return web.Response()
+
+
+async def register_webhook(bot: Bot, dp) -> None:
     await bot.set_webhook(
         url=conf.webhook.url,
         secret_token=conf.webhook.secret,
         allowed_updates=dp.resolve_used_update_types(),
     )
 
+
+async def _connect_redis():
+    with startup_timer.stage("redis"):
+        await RedisManager.init()
+    await lang_cache.start()
+
+
+async def on_startup(app: web.Application):
+    # Redis and Postgres don't depend on each other: connect to both at once
+    await asyncio.gather(_connect_redis(), init_db())
+    await catalog.start()
+    await profile_buffer.start()
+    await update_scheduler.start()
+    await tracer.start()
+    if app["metrics_port"] is not None:
+        await start_metrics_server(app["metrics_port"])
+    if app["register_webhook"]:
+        with startup_timer.stage("webhook"):
+            await register_webhook(app["bot"], app["dp"])
+    await broadcaster.resume(app["bot"])
+    logger.info("webhook startup finished", path=conf.webhook.path())
+    startup_timer.report(mode="webhook")
+
+
+async def on_shutdown(app: web.Application):
+    await update_scheduler.close(timeout=conf.webhook.shutdown_timeout)
+    await catalog.stop()
+    await broadcaster.stop()
+    try:
+        await app["dp"].storage.close()
+    except Exception:
+        logger.exception("closing storage failed")
+    try:
+        await app["bot"].session.close()
+    except Exception:
+        logger.exception("closing bot session failed")
+    await profile_buffer.stop()
+    await lang_cache.stop()
+    await RedisManager.close()
+    await dispose_db()
+    await stop_metrics_server()
+    await tracer.stop()
+    logger.info("webhook shutdown finished")
+
+
+async def create_app(register: bool = True, metrics_port: Optional[int] = None):
+    # metrics_port: serve /metrics there instead of on the shared (SO_REUSEPORT) webhook port,
+    # where a scrape would land on a random worker
     app = web.Application()
-    app["bot"] = bot
-    app["dp"] = dp
-
-    # aiogram webhook integration: use /webhook/{token} path (Telegram will send updates here)
-    async def handle_update(request):
-        body = await request.read()
-        update = body
-        # aiogram will handle it via bot
-        # Simpler approach: use aiogram's built-in webhook support (not fully expanded here)
-        return web.Response(text="ok")
-
-    app.router.add_post(f"/webhook/{conf.bot.token}", handle_update)
+    app["register_webhook"] = register
+    app["metrics_port"] = metrics_port
+    app["bot"] = create_bot()
+    app["dp"] = create_dispatcher()
+    app.router.add_post(conf.webhook.path(), handle_update)
+    if metrics_port is None:
+        add_metrics_route(app, public=True)
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
     return app
 
 
+def run_webhook(register: bool = True, reuse_port: bool = False, metrics_port: Optional[int] = None):
+    web.run_app(create_app(register=register, metrics_port=metrics_port), host=conf.webhook.host or "0.0.0.0", port=conf.webhook.port,
+                shutdown_timeout=conf.webhook.shutdown_timeout, reuse_port=reuse_port)
+
+
 if __name__ == "__main__":
-    web.run_app(create_app(), host=conf.webhook.host or "0.0.0.0", port=conf.webhook.port)
+    run_webhook()
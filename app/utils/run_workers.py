@@ -0,0 +1,126 @@
+# app/utils/run_workers.py
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+from typing import List, Optional
+
+from app.core.config import conf
+from app.core.logger import get_logger
+
+logger = get_logger()
+
+CHECK_INTERVAL = 0.5
+# a worker that dies sooner than this after start counts as a crash loop and is restarted with backoff
+MIN_UPTIME = 5.0
+MAX_RESTART_DELAY = 30.0
+
+
+def _worker_main(index: int) -> None:
+    # fresh interpreter ("spawn"): own DB engine, Redis client, caches and scheduler
+    t0 = time.perf_counter()
+    from app.core.startup import startup_timer
+    from app.utils.run_webhook import run_webhook
+
+    startup_timer.mark_imports(t0)
+    logger.info("worker started", worker=index, pid=os.getpid())
+    run_webhook(register=False, reuse_port=True, metrics_port=conf.metrics.port + index)
+
+
+async def _register_webhook() -> None:
+    from app.bot.dispatcher import create_bot, create_dispatcher
+    from app.utils.run_webhook import register_webhook
+
+    bot = create_bot()
+    try:
+        await register_webhook(bot, create_dispatcher())
+    finally:
+        await bot.session.close()
+
+
+class _Slot:
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[multiprocessing.Process] = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.restart_at = 0.0
+
+
+# Starts N webhook workers that all bind WEBHOOK_PORT with SO_REUSEPORT, so the kernel spreads
+# connections across them. Crashed workers are restarted; SIGTERM/SIGINT stop them gracefully.
+# Each worker has its own Prometheus registry and serves it on METRICS_PORT + worker index,
+# so every port is a scrape target. The ChatScheduler is per process too: updates of one chat
+# that land on different workers can run concurrently and out of order (the Redis update dedup
+# still holds), so use polling or a single worker where strict ordering matters.
+class Supervisor:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._ctx = multiprocessing.get_context("spawn")
+        self._slots: List[_Slot] = [_Slot(i) for i in range(workers)]
+        self._stopping = False
+
+    def run(self) -> None:
+        asyncio.run(_register_webhook())
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        for slot in self._slots:
+            self._start(slot)
+        logger.info("supervisor started", workers=self.workers, port=conf.webhook.port,
+                    metrics_ports=f"{conf.metrics.port}-{conf.metrics.port + self.workers - 1}")
+        while not self._stopping:
+            time.sleep(CHECK_INTERVAL)
+            for slot in self._slots:
+                self._check(slot)
+        self._drain()
+
+    def _on_signal(self, signum, frame) -> None:
+        logger.info("supervisor signal received", signal=signum)
+        self._stopping = True
+
+    def _start(self, slot: _Slot) -> None:
+        slot.process = self._ctx.Process(target=_worker_main, args=(slot.index,), name=f"webhook-worker-{slot.index}")
+        slot.process.start()
+        slot.started_at = time.monotonic()
+
+    def _check(self, slot: _Slot) -> None:
+        now = time.monotonic()
+        if slot.process is not None and slot.process.is_alive():
+            if slot.failures and now - slot.started_at > MIN_UPTIME:
+                slot.failures = 0
+            return
+        if slot.process is not None:
+            exitcode = slot.process.exitcode
+            slot.process = None
+            if now - slot.started_at < MIN_UPTIME:
+                slot.failures += 1
+            delay = min(2 ** slot.failures, MAX_RESTART_DELAY) if slot.failures else 0
+            slot.restart_at = now + delay
+            logger.error("worker exited", worker=slot.index, exitcode=exitcode, restart_in=delay)
+        if now >= slot.restart_at:
+            self._start(slot)
+
+    def _drain(self) -> None:
+        alive = [s.process for s in self._slots if s.process is not None and s.process.is_alive()]
+        logger.info("supervisor draining", workers=len(alive))
+        for p in alive:
+            # aiohttp handles SIGTERM: stop accepting, finish in-flight updates, run on_shutdown
+            p.terminate()
+        deadline = time.monotonic() + conf.webhook.shutdown_timeout + 5
+        for p in alive:
+            p.join(max(deadline - time.monotonic(), 0))
+        for p in alive:
+            if p.is_alive():
+                logger.warning("worker did not stop in time, killing", pid=p.pid)
+                p.kill()
+                p.join()
+        logger.info("supervisor stopped")
+
+
+def run_workers() -> None:
+    Supervisor(conf.webhook.workers or os.cpu_count() or 1).run()
+
+
+if __name__ == "__main__":
+    run_workers()
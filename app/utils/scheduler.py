@@ -0,0 +1,119 @@
+# app/utils/scheduler.py
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional
+
+import aiojobs
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+
+from app.core.config import conf
+from app.core.logger import get_logger
+from app.core.metrics import SCHEDULER_ACTIVE, SCHEDULER_CHATS, SCHEDULER_QUEUED
+
+logger = get_logger()
+
+Job = Callable[[], Awaitable[Any]]
+
+
+def chat_key(update: Update) -> Optional[int]:
+    ctx = UserContextMiddleware.resolve_event_context(event=update)
+    return ctx.chat_id if ctx.chat_id is not None else ctx.user_id
+
+
+# Runs jobs of the same key (chat) one after another and different keys in parallel.
+# Every key with pending work owns one aiojobs job that drains its queue, so `limit`
+# bounds how many chats are processed at once; `max_queued` bounds accepted-but-unfinished
+# jobs overall and makes submit() wait when reached.
+class ChatScheduler:
+    def __init__(self, limit: int, max_queued: int):
+        self.limit = limit
+        self.max_queued = max_queued
+        self._scheduler: Optional[aiojobs.Scheduler] = None
+        self._queues: Dict[Hashable, Deque[Job]] = {}
+        self._slots = asyncio.Semaphore(max_queued)
+        self._queued = 0
+        self._in_flight = 0
+        SCHEDULER_QUEUED.set_function(lambda: self._queued)
+        SCHEDULER_ACTIVE.set_function(lambda: self.active)
+        SCHEDULER_CHATS.set_function(lambda: len(self._queues))
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def active(self) -> int:
+        return self._scheduler.active_count if self._scheduler else 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def stats(self) -> dict:
+        return {"queued": self._queued, "active": self.active, "chats": len(self._queues),
+                "in_flight": self._in_flight}
+
+    async def start(self) -> None:
+        if self._scheduler is None:
+            self._scheduler = aiojobs.Scheduler(limit=self.limit, pending_limit=self.max_queued,
+                                                exception_handler=self._on_exception)
+
+    async def submit(self, key: Optional[Hashable], job: Job) -> None:
+        await self._slots.acquire()
+        self._in_flight += 1
+        self._queued += 1
+        if key is None:
+            await self._scheduler.spawn(self._run_single(job))
+            return
+        queue = self._queues.get(key)
+        if queue is not None:
+            # a drain job for this chat is already scheduled and will pick it up in order
+            queue.append(job)
+            return
+        self._queues[key] = deque([job])
+        await self._scheduler.spawn(self._drain(key))
+
+    async def close(self, timeout: Optional[float] = None) -> None:
+        if self._scheduler is None:
+            return
+        if self._in_flight:
+            logger.info("scheduler draining", **self.stats())
+        await self._scheduler.wait_and_close(timeout)
+        self._scheduler = None
+
+    async def _drain(self, key: Hashable) -> None:
+        queue = self._queues[key]
+        try:
+            while queue:
+                await self._run(queue.popleft())
+        finally:
+            self._queues.pop(key, None)
+            for _ in range(len(queue)):
+                self._done()
+
+    async def _run_single(self, job: Job) -> None:
+        await self._run(job)
+
+    async def _run(self, job: Job) -> None:
+        self._queued -= 1
+        try:
+            await job()
+        except Exception:
+            # failures are logged by ChatLoggerMiddleware; keep draining the chat
+            logger.debug("scheduled update failed", exc_info=True)
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+    def _done(self) -> None:
+        self._queued -= 1
+        self._in_flight -= 1
+        self._slots.release()
+
+    @staticmethod
+    def _on_exception(scheduler: aiojobs.Scheduler, context: Dict[str, Any]) -> None:
+        logger.error("scheduler job failed", message=context.get("message"), exc=str(context.get("exception")))
+
+
+update_scheduler = ChatScheduler(limit=conf.bot.update_concurrency, max_queued=conf.bot.update_queue_limit)
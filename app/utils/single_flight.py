@@ -0,0 +1,36 @@
+# app/utils/single_flight.py
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.core.metrics import SINGLEFLIGHT_CALLS
+
+T = TypeVar("T")
+
+
+# Concurrent do(key, fn) calls for the same key share one execution of fn. The call runs
+# in its own task, so a cancelled caller doesn't cancel it for the others still waiting.
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            SINGLEFLIGHT_CALLS.labels(self.name, "leader").inc()
+        else:
+            SINGLEFLIGHT_CALLS.labels(self.name, "shared").inc()
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # mark the exception retrieved even if every caller was cancelled
+        if not task.cancelled():
+            task.exception()
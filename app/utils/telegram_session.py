@@ -0,0 +1,80 @@
+# app/utils/telegram_session.py
+import asyncio
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, AnswerInlineQuery, TelegramMethod
+
+from app.core.config import conf
+from app.core.logger import get_logger
+from app.core.metrics import SEND_DELAY, SEND_QUEUE_DEPTH, SEND_RETRY_AFTER
+from app.core.tracing import tracer
+from app.utils.rate_limit import KeyedBuckets, PriorityLimiter
+
+logger = get_logger()
+
+# methods that put a message into a chat and count against Telegram's per-chat limit
+CHAT_LIMITED_PREFIXES = ("Send", "Copy", "Forward", "Edit")
+PRIORITY_METHODS = (AnswerCallbackQuery, AnswerInlineQuery)
+HIGH, NORMAL = 0, 1
+
+
+# AiohttpSession that paces outgoing messages below Telegram's flood limits: one global
+# token bucket (callback answers jump the line) plus a bucket per chat, and waits out a
+# 429 retry_after instead of surfacing it to handlers: a chat's 429 only holds back that
+# chat, one without a chat (bot-wide) holds back everything.
+class RateLimitedSession(AiohttpSession):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.global_limiter = PriorityLimiter(rate=conf.send.global_rate, capacity=conf.send.global_rate)
+        self.chat_buckets = KeyedBuckets()
+        SEND_QUEUE_DEPTH.set_function(lambda: self.global_limiter.depth)
+
+    def stats(self) -> dict:
+        return {"queue_depth": self.global_limiter.depth, "chats": len(self.chat_buckets)}
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None):
+        with tracer.span("telegram", method=type(method).__name__) as span:
+            return await self._make_request(bot, method, timeout, span)
+
+    async def _make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int], span):
+        name = type(method).__name__
+        priority = isinstance(method, PRIORITY_METHODS)
+        chat_id = getattr(method, "chat_id", None) if name.startswith(CHAT_LIMITED_PREFIXES) else None
+        limited = priority or chat_id is not None
+        attempt = 0
+        while True:
+            if limited:
+                waited = 0.0
+                if chat_id is not None:
+                    waited += await self._chat_bucket(chat_id).acquire()
+                waited += await self.global_limiter.acquire(HIGH if priority else NORMAL)
+                SEND_DELAY.labels(name).observe(waited)
+                if span is not None:
+                    span.set("limiter_wait_ms", round(waited * 1000, 2))
+            try:
+                return await super().make_request(bot, method, timeout)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                SEND_RETRY_AFTER.labels(name).inc()
+                if attempt > conf.send.max_retries:
+                    raise
+                if span is not None:
+                    span.set("retries", attempt)
+                logger.warning("telegram flood control", method=name, chat_id=chat_id,
+                               retry_after=e.retry_after, attempt=attempt)
+                if chat_id is not None:
+                    # the next acquire() of this chat's bucket waits it out
+                    self._chat_bucket(chat_id).pause(e.retry_after)
+                    continue
+                self.global_limiter.pause(e.retry_after)
+                if not limited:
+                    await asyncio.sleep(e.retry_after)
+
+    def _chat_bucket(self, chat_id):
+        if isinstance(chat_id, int) and chat_id > 0:
+            return self.chat_buckets.get(chat_id, conf.send.chat_rate, conf.send.chat_burst)
+        # groups and channels (negative ids, @usernames): 20 messages per minute
+        return self.chat_buckets.get(chat_id, conf.send.group_rate_per_min / 60, conf.send.chat_burst)
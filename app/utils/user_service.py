@@ -1,18 +1,43 @@
 # app/utils/user_service.py
-from typing import Optional
+import asyncio
+import hashlib
+import time
+from typing import Optional, Tuple
 
-from sqlalchemy import select, update
+import orjson
+
+from sqlalchemy import select, update, literal, exists, or_
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
 
+from app.core.config import conf
 from app.core.logger import get_logger
-from app.db.models import User
+from app.db.lazy_session import LazySessionProxy
+from app.db.models import User, utc_now
+from app.db.session import AsyncSessionLocal, db_breaker, replica_set
+from app.utils.lang_cache import lang_cache
+from app.utils.single_flight import SingleFlight
 
 logger = get_logger()
 CACHE_TTL = 7 * 24 * 3600
+LOCK_POLL_INTERVAL = 0.02
+# negative entries stored under user:{chat_id}:lang
+NO_LANG = "-"  # user exists, language not chosen yet
+NO_USER = "?"  # no users row for this chat_id
+NEGATIVE_ENTRIES = (NO_LANG, NO_USER)
+
+# cached (user_id, language, profile fingerprint)
+Profile = Tuple[int, Optional[str], str]
+
+_lang_flight = SingleFlight("lang")
+
+
+def is_lang(entry: Optional[str]) -> bool:
+    return entry is not None and entry not in NEGATIVE_ENTRIES
 
 
 async def redis_get_lang(redis_client, chat_id: int) -> Optional[str]:
+    # raw cache entry: a language code, NO_LANG, NO_USER or None (not cached)
     if redis_client is None:
         return None
     try:
@@ -24,99 +49,242 @@ async def redis_get_lang(redis_client, chat_id: int) -> Optional[str]:
             return val.decode("utf-8", errors="ignore")
         return str(val)
     except Exception as e:
-        logger.warning("redis_get_lang error %s: %s", chat_id, e)
+        logger.warning("redis_get_lang_failed", chat_id=chat_id, error=str(e))
         return None
 
 
-async def db_get_lang(session, chat_id: int) -> Optional[str]:
+async def db_get_lang_entry(session, chat_id: int) -> Optional[str]:
+    # language code, NO_LANG (row without language) or NO_USER; None on DB error
     try:
-        res = await session.execute(select(User).where(User.chat_id == chat_id))
-        user = res.scalars().first()
-        if not user:
-            return None
-        return user.language
+        res = await session.execute(select(User.language).where(User.chat_id == chat_id))
+        row = res.first()
+        if row is None:
+            return NO_USER
+        return row[0] or NO_LANG
     except Exception as e:
-        logger.exception("DB read error for %s: %s", chat_id, e)
+        logger.exception("db_get_lang_failed", chat_id=chat_id, error=str(e))
         return None
 
 
-async def get_lang_cache_then_db(session, redis_client, chat_id: int) -> Optional[str]:
-    lang = await redis_get_lang(redis_client, chat_id)
-    if lang:
-        logger.info("redis hit %s -> %s", chat_id, lang)
-        return lang
-    lang = await db_get_lang(session, chat_id)
-    if lang:
-        logger.info("DB hit %s -> %s", chat_id, lang)
+async def get_cached_entry(redis_client, chat_id: int) -> Optional[str]:
+    entry = lang_cache.get(chat_id)
+    if entry:
+        return entry
+    entry = await redis_get_lang(redis_client, chat_id)
+    if is_lang(entry):
+        logger.info("lang_redis_hit", chat_id=chat_id, lang=entry)
+        lang_cache.set(chat_id, entry)
+    elif entry is not None:
+        lang_cache.set(chat_id, entry, ttl=min(conf.cache.lang_neg_ttl, conf.cache.lang_ttl))
+    return entry
+
+
+async def get_lang_cache_then_db(redis_client, chat_id: int) -> Optional[str]:
+    entry = await get_cached_entry(redis_client, chat_id)
+    if entry is not None:
+        # a cached NO_LANG / NO_USER answers without touching the DB
+        return entry if is_lang(entry) else None
+    # concurrent misses for one chat share a single DB lookup. It runs in its own task with
+    # its own session: callers from other updates must not depend on (or outlive) the
+    # session of whichever update started it.
+    return await _lang_flight.do(chat_id, lambda: _load_lang(redis_client, chat_id))
+
+
+async def _load_lang(redis_client, chat_id: int) -> Optional[str]:
+    lock_key = None
+    if conf.cache.lang_lock_ms and redis_client is not None:
+        lock_key = f"lock:user:{chat_id}:lang"
         try:
-            if redis_client is not None:
-                await redis_client.set(f"user:{chat_id}:lang", lang, ex=CACHE_TTL)
-                logger.info("redis set %s -> %s", chat_id, lang)
+            if not await redis_client.set(lock_key, 1, nx=True, px=conf.cache.lang_lock_ms):
+                # another replica is loading it: wait for its result, then fall back to the DB
+                lock_key = None
+                entry = await _wait_for_lang(redis_client, chat_id)
+                if entry is not None:
+                    return entry if is_lang(entry) else None
         except Exception:
-            logger.warning("redis set failed for %s", chat_id)
-    return lang
+            lock_key = None
+            logger.warning("lang_lock_failed", chat_id=chat_id, exc_info=True)
+    session = LazySessionProxy(session_maker=AsyncSessionLocal, replicas=replica_set, breaker=db_breaker)
+    try:
+        entry = await db_get_lang_entry(session, chat_id)
+        # hand the connection back before the Redis writes; the close below is then a no-op
+        await session.close()
+        if is_lang(entry):
+            logger.info("lang_db_hit", chat_id=chat_id, lang=entry)
+            await cache_lang(redis_client, chat_id, entry)
+            return entry
+        if entry is not None:
+            await cache_negative(redis_client, chat_id, entry)
+        return None
+    finally:
+        await session.close()
+        if lock_key is not None:
+            try:
+                await redis_client.delete(lock_key)
+            except Exception:
+                pass
 
 
-async def ensure_user_exists(session, chat_id: int, username: Optional[str], first_name: Optional[str],
-                             is_premium: Optional[bool], default_lang: Optional[str] = None,
-                             added_by: Optional[str] = None) -> int:
+async def _wait_for_lang(redis_client, chat_id: int) -> Optional[str]:
+    deadline = time.monotonic() + conf.cache.lang_lock_ms / 1000
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        entry = await redis_get_lang(redis_client, chat_id)
+        if entry is not None:
+            if is_lang(entry):
+                lang_cache.set(chat_id, entry)
+            return entry
+    return None
+
+
+async def cache_lang(redis_client, chat_id: int, lang: str) -> None:
+    lang_cache.set(chat_id, lang)
     try:
-        res = await session.execute(select(User).where(User.chat_id == chat_id))
-        user = res.scalars().first()
-        if user:
-            need_update = (
-                    (username is not None and user.username != username) or
-                    (first_name is not None and user.first_name != first_name) or
-                    (is_premium is not None and user.is_premium != is_premium)
-            )
-            if need_update:
-                await session.execute(
-                    update(User)
-                    .where(User.chat_id == chat_id)
-                    .values(username=username, first_name=first_name, is_premium=is_premium)
-                )
-            logger.info("ensure_user_exists: found existing chat_id=%s id=%s", chat_id, user.id)
-            return user.id
-
-        ins = pg_insert(User).values(
-            chat_id=chat_id,
-            username=username,
-            first_name=first_name,
-            is_premium=is_premium,
-            language=default_lang,
-            added_by=added_by
-        )
-        stmt = ins.on_conflict_do_update(
-            index_elements=[User.chat_id],
-            set_={
-                "username": ins.excluded.username,
-                "first_name": ins.excluded.first_name,
-                "is_premium": ins.excluded.is_premium,
-            }
-        ).returning(User.id)
+        if redis_client is not None:
+            await redis_client.set(f"user:{chat_id}:lang", lang, ex=CACHE_TTL)
+            logger.info("lang_redis_set", chat_id=chat_id, lang=lang)
+    except Exception:
+        logger.warning("lang_redis_set_failed", chat_id=chat_id, exc_info=True)
+
+
+async def cache_negative(redis_client, chat_id: int, entry: str) -> None:
+    # short-lived "no language yet" / "no such user" marker; replaced by cache_set_lang
+    ttl = conf.cache.lang_neg_ttl
+    lang_cache.set(chat_id, entry, ttl=min(ttl, conf.cache.lang_ttl))
+    try:
+        if redis_client is not None:
+            await redis_client.set(f"user:{chat_id}:lang", entry, ex=ttl)
+    except Exception:
+        logger.warning("lang_redis_set_failed", chat_id=chat_id, exc_info=True)
+
+
+async def cache_set_lang(redis_client, chat_id: int, lang: str) -> None:
+    # language changed: also drop the value cached by other replicas
+    await cache_lang(redis_client, chat_id, lang)
+    await drop_profile(redis_client, chat_id)
+    await lang_cache.publish_invalidate(redis_client, chat_id)
+
+
+def profile_fingerprint(username: Optional[str], first_name: Optional[str], is_premium: Optional[bool]) -> str:
+    raw = orjson.dumps([username, first_name, is_premium])
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
 
+async def get_cached_profile(redis_client, chat_id: int) -> Optional[Profile]:
+    # (user_id, language, fingerprint) or None; local tier first, then user:{chat_id}:profile
+    profile = lang_cache.get_profile(chat_id)
+    if profile is not None:
+        return profile
+    if redis_client is None:
+        return None
+    try:
+        raw = await redis_client.get(f"user:{chat_id}:profile")
+        if raw is None:
+            return None
+        blob = orjson.loads(raw)
+        profile = (blob["i"], blob["l"], blob["f"])
+    except Exception:
+        logger.warning("profile_cache_read_failed", chat_id=chat_id, exc_info=True)
+        return None
+    lang_cache.set_profile(chat_id, profile)
+    return profile
+
+
+async def cache_profile(redis_client, chat_id: int, user_id: int, lang: Optional[str], fingerprint: str) -> None:
+    lang_cache.set_profile(chat_id, (user_id, lang, fingerprint))
+    try:
+        if redis_client is not None:
+            blob = orjson.dumps({"i": user_id, "l": lang, "f": fingerprint})
+            await redis_client.set(f"user:{chat_id}:profile", blob, ex=CACHE_TTL)
+    except Exception:
+        logger.warning("profile_cache_write_failed", chat_id=chat_id, exc_info=True)
+
+
+async def refresh_profile_fingerprint(redis_client, chat_id: int, fingerprint: str) -> None:
+    # after the profile buffer committed the new fields: only touches a still-cached profile,
+    # so a language change (drop_profile) in between isn't overwritten with the old language
+    profile = await get_cached_profile(redis_client, chat_id)
+    if profile is None or profile[2] == fingerprint:
+        return
+    await cache_profile(redis_client, chat_id, profile[0], profile[1], fingerprint)
+
+
+async def drop_profile(redis_client, chat_id: int) -> None:
+    lang_cache.pop_profile(chat_id)
+    try:
+        if redis_client is not None:
+            await redis_client.delete(f"user:{chat_id}:profile")
+    except Exception:
+        logger.warning("profile_cache_drop_failed", chat_id=chat_id, exc_info=True)
+
+
+async def upsert_user(session, chat_id: int, username: Optional[str], first_name: Optional[str],
+                      is_premium: Optional[bool], default_lang: Optional[str] = None,
+                      added_by: Optional[str] = None) -> Tuple[int, Optional[str]]:
+    # One statement: insert or refresh the profile (only if a field actually changed) and
+    # return (id, language). The UNION branch covers the unchanged row, for which
+    # ON CONFLICT ... WHERE returns nothing.
+    ins = pg_insert(User).values(
+        chat_id=chat_id,
+        username=username,
+        first_name=first_name,
+        is_premium=is_premium,
+        language=default_lang,
+        added_by=added_by,
+        created_at=utc_now(),
+    )
+    upserted = ins.on_conflict_do_update(
+        index_elements=[User.chat_id],
+        set_={
+            "username": ins.excluded.username,
+            "first_name": ins.excluded.first_name,
+            "is_premium": ins.excluded.is_premium,
+        },
+        where=or_(
+            User.username.is_distinct_from(ins.excluded.username),
+            User.first_name.is_distinct_from(ins.excluded.first_name),
+            User.is_premium.is_distinct_from(ins.excluded.is_premium),
+        )
+    ).returning(User.id, User.language).cte("upserted")
+    stmt = select(upserted.c.id, upserted.c.language, literal(True).label("written")).union_all(
+        select(User.id, User.language, literal(False)).where(User.chat_id == chat_id, ~exists(select(upserted.c.id)))
+    )
+    try:
         res = await session.execute(stmt)
-        # mark that we performed a write
-        try:
-            session.info["writes"] = True
-        except Exception:
-            pass
-        user_id = res.scalar_one()
-        logger.info("ensure_user_exists: inserted chat_id=%s id=%s", chat_id, user_id)
-        return user_id
+        row = res.first()
+        if row is None:
+            # conflicting row was inserted concurrently after our snapshot
+            res = await session.execute(select(User.id, User.language).where(User.chat_id == chat_id))
+            row = (*res.one(), False)
+        user_id, language, written = row
+        if written:
+            try:
+                session.info["writes"] = True
+            except Exception:
+                pass
+        logger.info("user_upserted", chat_id=chat_id, user_id=user_id, written=written)
+        return user_id, language
 
     except SQLAlchemyError as e:
-        logger.exception("ensure_user_exists failed for %s: %s", chat_id, e)
+        logger.exception("upsert_user_failed", chat_id=chat_id, error=str(e))
         raise
 
 
+async def ensure_user_exists(session, chat_id: int, username: Optional[str], first_name: Optional[str],
+                             is_premium: Optional[bool], default_lang: Optional[str] = None,
+                             added_by: Optional[str] = None) -> int:
+    user_id, _ = await upsert_user(session, chat_id, username, first_name, is_premium,
+                                   default_lang=default_lang, added_by=added_by)
+    return user_id
+
+
 async def upsert_user_language(session, chat_id: int, language: str) -> int:
     try:
         upd = update(User).where(User.chat_id == chat_id).values(language=language).returning(User.id)
         res = await session.execute(upd)
         user_id = res.scalar_one_or_none()
         if user_id:
-            logger.info("upsert_user_language: updated chat_id=%s id=%s lang=%s", chat_id, user_id, language)
+            logger.info("user_language_updated", chat_id=chat_id, user_id=user_id, lang=language)
             return user_id
 
         ins = pg_insert(User).values(chat_id=chat_id, language=language)
@@ -131,9 +299,9 @@ async def upsert_user_language(session, chat_id: int, language: str) -> int:
         except Exception:
             pass
         user_id = res.scalar_one()
-        logger.info("upsert_user_language: inserted (fallback) chat_id=%s id=%s lang=%s", chat_id, user_id, language)
+        logger.info("user_language_inserted", chat_id=chat_id, user_id=user_id, lang=language)
         return user_id
 
     except Exception as e:
-        logger.exception("upsert_user_language failed for %s: %s", chat_id, e)
+        logger.exception("upsert_user_language_failed", chat_id=chat_id, error=str(e))
         raise
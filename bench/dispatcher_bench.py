@@ -0,0 +1,346 @@
+# bench/dispatcher_bench.py
+#
+# Drives the dispatcher built by app.bot.dispatcher.create_dispatcher() (the same stack main.py
+# runs) with synthetic updates and a stub Bot session, and reports throughput plus p50/p95/p99
+# per stage. Needs a local Postgres from DB_URL; Redis is used when --redis real (default),
+# with --redis none the bot runs on its in-process fallbacks.
+#
+# The stub session replaces create_bot()'s RateLimitedSession, so outgoing calls are not held to
+# the SEND_* flood limits: the numbers are the bot's own cost, not Telegram's ~30 msg/s ceiling.
+#
+#   python -m bench.dispatcher_bench --updates 5000 --concurrency 50
+#   python -m bench.dispatcher_bench --compare bench/results/<previous>.json
+import argparse
+import asyncio
+import itertools
+import random
+import statistics
+import subprocess
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import orjson
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Update
+from sqlalchemy import delete
+
+from app.bot.dispatcher import create_dispatcher
+from app.core.logger import get_logger
+from app.db.instrumentation import profiler
+from app.db.models import User
+from app.db.session import AsyncSessionLocal, init_db, dispose_db
+from app.utils.profile_writer import profile_buffer
+from app.utils.redis_manager import RedisManager
+
+logger = get_logger()
+
+RESULTS_DIR = Path(__file__).parent / "results"
+BENCH_TOKEN = "123456:BENCHMARK-TOKEN"
+# synthetic users live far above real Telegram ids so cleanup cannot touch real rows
+CHAT_ID_BASE = 9_000_000_000_000
+LANGS = ("uz", "ru", "en")
+TIMINGS_KEY = "_bench_timings"
+
+
+class StubSession(BaseSession):
+    def __init__(self, latency_ms: float = 0.0):
+        super().__init__()
+        self.latency = latency_ms / 1000
+        self.calls: Counter = Counter()
+
+    async def make_request(self, bot: Bot, method, timeout: Optional[int] = None):
+        # serialize like AiohttpSession.build_form_data would, then pretend Telegram accepted it
+        files: Dict[str, Any] = {}
+        for value in method.model_dump(warnings=False).values():
+            self.prepare_value(value, bot=bot, files=files)
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        raise NotImplementedError("StubSession has no files to download; the bench workload never calls it")
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+class StageTimer(BaseMiddleware):
+    def __init__(self, name: str, inner):
+        self.name = name
+        self.inner = inner
+
+    async def __call__(self, handler: Callable[[Any, dict], Awaitable[Any]], event: Any, data: dict):
+        timings = data.setdefault(TIMINGS_KEY, {})
+        start = time.perf_counter()
+        try:
+            return await self.inner(handler, event, data)
+        finally:
+            timings[self.name] = time.perf_counter() - start
+
+
+class HandlerTimer(BaseMiddleware):
+    async def __call__(self, handler: Callable[[Any, dict], Awaitable[Any]], event: Any, data: dict):
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            timings = data.get(TIMINGS_KEY)
+            if timings is not None:
+                timings["handler"] = time.perf_counter() - start
+
+
+def instrument(dp) -> List[str]:
+    # wrap every outer update middleware so inclusive times can be turned into per-stage times
+    original = list(dp.update.outer_middleware)
+    for mw in original:
+        dp.update.outer_middleware.unregister(mw)
+    names = []
+    for mw in original:
+        name = type(mw).__name__
+        names.append(name)
+        dp.update.outer_middleware.register(StageTimer(name, mw))
+    dp.message.middleware(HandlerTimer())
+    dp.callback_query.middleware(HandlerTimer())
+    return names
+
+
+class Workload:
+    def __init__(self, worker: int, weights: Dict[str, float], rnd: random.Random):
+        self.worker = worker
+        self.weights = weights
+        self.rnd = rnd
+        self.awaiting_lang: List[int] = []
+        self.returning: List[int] = []
+        self._ids = itertools.count()
+
+    def next_action(self) -> str:
+        action = self.rnd.choices(list(self.weights), weights=list(self.weights.values()))[0]
+        if action == "callback" and not self.awaiting_lang:
+            return "new"
+        if action == "returning" and not self.returning:
+            return "new"
+        return action
+
+    def build(self, update_id: int, bot: Bot) -> Tuple[str, Update]:
+        action = self.next_action()
+        if action == "new":
+            chat_id = CHAT_ID_BASE + self.worker * 10_000_000 + next(self._ids)
+            self.awaiting_lang.append(chat_id)
+            payload = _message(update_id, chat_id, "/start")
+        elif action == "callback":
+            chat_id = self.awaiting_lang.pop(self.rnd.randrange(len(self.awaiting_lang)))
+            self.returning.append(chat_id)
+            payload = _callback(update_id, chat_id, self.rnd.choice(LANGS))
+        else:
+            chat_id = self.rnd.choice(self.returning)
+            payload = _message(update_id, chat_id, self.rnd.choice(("/start", "/lang")))
+        return action, Update.model_validate(payload, context={"bot": bot})
+
+
+def _user(chat_id: int) -> dict:
+    return {"id": chat_id, "is_bot": False, "first_name": f"bench{chat_id % 1000}", "username": f"b{chat_id}"}
+
+
+def _message(update_id: int, chat_id: int, text: str) -> dict:
+    entities = [{"type": "bot_command", "offset": 0, "length": len(text)}] if text.startswith("/") else None
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": int(time.time()), "text": text, "entities": entities,
+            "chat": {"id": chat_id, "type": "private"}, "from": _user(chat_id),
+        },
+    }
+
+
+def _callback(update_id: int, chat_id: int, lang: str) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "chat_instance": str(chat_id), "data": f"lang:{lang}", "from": _user(chat_id),
+            "message": {"message_id": update_id, "date": int(time.time()), "text": "Choose language",
+                        "chat": {"id": chat_id, "type": "private"}},
+        },
+    }
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    if len(values) == 1:
+        values = values * 2
+    q = statistics.quantiles(values, n=100, method="inclusive")
+    return {
+        "p50_ms": round(q[49] * 1000, 3),
+        "p95_ms": round(q[94] * 1000, 3),
+        "p99_ms": round(q[98] * 1000, 3),
+        "mean_ms": round(statistics.fmean(values) * 1000, 3),
+    }
+
+
+async def run(args) -> dict:
+    dp = create_dispatcher()
+    stage_names = instrument(dp)
+    session = StubSession(latency_ms=args.api_latency_ms)
+    bot = Bot(token=BENCH_TOKEN, session=session)
+
+    if args.redis == "real":
+        await RedisManager.init()
+    await init_db()
+    await profile_buffer.start()
+
+    weights = {"new": args.new, "returning": args.returning, "callback": args.callback}
+    # update_ids unique across runs: the dedup middleware would drop a rerun's updates as redeliveries
+    update_ids = itertools.count(time.time_ns() // 1000)
+    samples: Dict[str, List[float]] = defaultdict(list)
+    totals: Dict[str, List[float]] = defaultdict(list)
+    errors = Counter()
+    per_worker = args.updates // args.concurrency
+
+    async def worker(n: int):
+        workload = Workload(n, weights, random.Random(args.seed + n))
+        for _ in range(per_worker):
+            action, update = workload.build(next(update_ids), bot)
+            start = time.perf_counter()
+            timings: Dict[str, float] = {}
+            try:
+                await dp.feed_update(bot, update, **{TIMINGS_KEY: timings})
+            except Exception:
+                errors[action] += 1
+            totals[action].append(time.perf_counter() - start)
+            for name, value in exclusive_stages(stage_names, timings).items():
+                samples[name].append(value)
+
+    if profiler is not None:
+        # only the measured updates, not init_db's checks
+        profiler.reset()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    sql = profiler.snapshot(sort="calls", limit=20) if profiler is not None else None
+    sql_calls = sum(e["calls"] for e in profiler.stats.values()) if profiler is not None else None
+
+    await profile_buffer.stop()
+    if not args.keep_users:
+        await cleanup()
+    await RedisManager.close()
+    await dispose_db()
+
+    processed = sum(len(v) for v in totals.values())
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_rev": _git_rev(),
+        "config": vars(args),
+        "updates": processed,
+        "errors": dict(errors),
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(processed / elapsed, 1) if elapsed else 0.0,
+        "latency": {action: percentiles(v) for action, v in totals.items()},
+        "stages": {name: percentiles(samples[name]) for name in [*stage_names, "routing", "handler"]},
+        "api_calls": dict(session.calls),
+        "sql": sql,
+        "statements_per_update": round(sql_calls / processed, 3) if sql_calls is not None and processed else None,
+    }
+
+
+def exclusive_stages(names: List[str], timings: Dict[str, float]) -> Dict[str, float]:
+    result = {}
+    inclusive = [timings.get(n) for n in names]
+    for i, name in enumerate(names):
+        if inclusive[i] is None:
+            continue
+        inner = inclusive[i + 1] if i + 1 < len(names) and inclusive[i + 1] is not None else None
+        if inner is None:
+            # innermost middleware: everything below it is routing/filters plus the handler
+            handler = timings.get("handler", 0.0)
+            result["routing"] = max(inclusive[i] - handler, 0.0)
+            if "handler" in timings:
+                result["handler"] = handler
+            continue
+        result[name] = max(inclusive[i] - inner, 0.0)
+    return result
+
+
+async def cleanup():
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(User).where(User.chat_id >= CHAT_ID_BASE))
+        await session.commit()
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(current: dict, baseline: dict) -> None:
+    def delta(now, before):
+        if not before:
+            return "n/a"
+        return f"{(now - before) / before * 100:+.1f}%"
+
+    print(f"updates/s: {current['updates_per_s']} vs {baseline['updates_per_s']} "
+          f"({delta(current['updates_per_s'], baseline['updates_per_s'])})")
+    now_sql, base_sql = current.get("statements_per_update"), baseline.get("statements_per_update")
+    if now_sql is not None and base_sql is not None:
+        # query-count regressions show up here before they show up as latency
+        print(f"SQL statements/update: {now_sql} vs {base_sql} ({delta(now_sql, base_sql)})")
+    for name, stats in current["stages"].items():
+        base = baseline.get("stages", {}).get(name) or {}
+        if stats and base:
+            print(f"  {name:28} p99 {stats['p99_ms']:8.3f} ms vs {base['p99_ms']:8.3f} ms "
+                  f"({delta(stats['p99_ms'], base['p99_ms'])})")
+
+
+def report(result: dict) -> None:
+    print(f"{result['updates']} updates in {result['elapsed_s']} s -> {result['updates_per_s']} updates/s")
+    if result["errors"]:
+        print(f"errors: {result['errors']}")
+    for title, table in (("latency by update kind", result["latency"]), ("stages", result["stages"])):
+        print(title)
+        for name, stats in table.items():
+            if stats:
+                print(f"  {name:28} p50 {stats['p50_ms']:8.3f}  p95 {stats['p95_ms']:8.3f}  "
+                      f"p99 {stats['p99_ms']:8.3f} ms")
+    if result.get("sql"):
+        print(f"SQL: {result['statements_per_update']} statements/update")
+        for s in result["sql"]["statements"][:10]:
+            print(f"  {s['calls']:8} calls {s['mean_ms']:8.3f} ms avg  {s['fingerprint'][:100]}")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="In-process dispatcher benchmark")
+    p.add_argument("--updates", type=int, default=2000)
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--new", type=float, default=0.2, help="weight of /start from new users")
+    p.add_argument("--returning", type=float, default=0.6, help="weight of /start and /lang from known users")
+    p.add_argument("--callback", type=float, default=0.2, help="weight of lang:* callbacks")
+    p.add_argument("--api-latency-ms", type=float, default=0.0, help="simulated Bot API latency")
+    p.add_argument("--redis", choices=("real", "none"), default="real")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--keep-users", action="store_true", help="do not delete synthetic users afterwards")
+    p.add_argument("--output", type=Path, default=None, help="result file (default: bench/results/<time>.json)")
+    p.add_argument("--compare", type=Path, default=None, help="previous result file to diff against")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    result = asyncio.run(run(args))
+    report(result)
+    output = args.output or RESULTS_DIR / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_bytes(orjson.dumps(result, option=orjson.OPT_INDENT_2, default=str))
+    print(f"saved {output}")
+    if args.compare:
+        compare(result, orjson.loads(args.compare.read_bytes()))
+
+
+if __name__ == "__main__":
+    main()
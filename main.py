@@ -1,42 +1,58 @@
 # main.py
+import time
+
+_T0 = time.perf_counter()
+
 import asyncio
 import signal
 
-from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
-
-from app.bot.handlers import start as start_pkg, callbacks as cb_pkg, lang_cmd as lang_pkg
-from app.middlewares.db_middleware import DBSessionMiddleware
-from app.middlewares.middleware import ChatLoggerMiddleware
-from app.middlewares.request_id_middleware import RequestIDMiddleware
+from app.bot.dispatcher import create_bot, create_dispatcher
+from app.bot.kb.translations import catalog
 from app.core.config import conf
 from app.core.logger import get_logger
+from app.core.metrics import start_metrics_server, stop_metrics_server
+from app.core.startup import startup_timer
+from app.core.tracing import tracer
 from app.db.session import init_db, dispose_db
+from app.utils.broadcast import broadcaster
+from app.utils.lang_cache import lang_cache
+from app.utils.polling import Poller, prepare_polling
+from app.utils.profile_writer import profile_buffer
 from app.utils.redis_manager import RedisManager
+from app.utils.scheduler import update_scheduler
 
 logger = get_logger()
 
 
 async def create_bot_and_dp():
-    bot = Bot(token=conf.bot.token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    dp = Dispatcher()
-    dp.update.outer_middleware(RequestIDMiddleware())
-    dp.update.outer_middleware(DBSessionMiddleware())
-    dp.update.outer_middleware(ChatLoggerMiddleware(logger=logger))
-    dp.include_router(start_pkg.router)
-    dp.include_router(cb_pkg.router)
-    dp.include_router(lang_pkg.router)
-    return bot, dp
+    return create_bot(), create_dispatcher()
+
+
+async def _connect_redis():
+    with startup_timer.stage("redis"):
+        await RedisManager.init()
+    await lang_cache.start()
 
 
 async def startup(bot, dp):
-    await RedisManager.init()
-    await init_db()
+    # Redis and Postgres don't depend on each other: connect to both at once
+    await asyncio.gather(_connect_redis(), init_db())
+    await catalog.start()
+    await profile_buffer.start()
+    await update_scheduler.start()
+    await start_metrics_server()
+    await tracer.start()
+    await broadcaster.resume(bot)
     logger.info("startup finished")
 
 
-async def shutdown(bot, dp):
+async def shutdown(bot, dp, poller=None):
+    # fetching has stopped: let in-flight updates finish, then record how far we got
+    await update_scheduler.close(timeout=conf.bot.update_drain_timeout)
+    if poller is not None:
+        await poller.save_offset()
+    await catalog.stop()
+    await broadcaster.stop()
     try:
         await dp.storage.close()
     except Exception:
@@ -45,8 +61,12 @@ async def shutdown(bot, dp):
         await bot.session.close()
     except Exception:
         logger.exception("closing bot session failed")
+    await profile_buffer.stop()
+    await lang_cache.stop()
     await RedisManager.close()
     await dispose_db()
+    await stop_metrics_server()
+    await tracer.stop()
     logger.info("shutdown finished")
 
 
@@ -66,16 +86,17 @@ async def run_polling():
             loop.add_signal_handler(s, _on_sig)
         except NotImplementedError:
             pass
-    await bot.delete_webhook(drop_pending_updates=True)
-    polling_task = asyncio.create_task(dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types()))
+    with startup_timer.stage("webhook"):
+        offset = await prepare_polling(bot)
+    startup_timer.report(mode="polling")
+    poller = Poller(bot, dp, update_scheduler, offset=offset)
+    polling_task = asyncio.create_task(poller.run())
     stop_task = asyncio.create_task(stop_event.wait())
     done, pending = await asyncio.wait([polling_task, stop_task], return_when=asyncio.FIRST_COMPLETED)
 
-    if not polling_task.done():
-        try:
-            await dp.stop_polling()
-        except Exception:
-            logger.exception("stop polling failed")
+    # stops fetching first; the updates still buffered are dropped unconfirmed (the saved
+    # offset stays below them), then the scheduler drains what was already handed to it
+    poller.stop()
 
     for t in (polling_task, stop_task):
         if not t.done():
@@ -85,11 +106,22 @@ async def run_polling():
             except asyncio.CancelledError:
                 pass
 
-    await shutdown(bot, dp)
+    await shutdown(bot, dp, poller)
 
 
 if __name__ == "__main__":
-    try:
-        asyncio.run(run_polling())
-    except KeyboardInterrupt:
-        pass
+    if conf.bot.run_mode == "webhook":
+        from app.utils.run_webhook import run_webhook
+
+        startup_timer.mark_imports(_T0)
+        run_webhook()
+    elif conf.bot.run_mode == "workers":
+        from app.utils.run_workers import run_workers
+
+        run_workers()
+    else:
+        startup_timer.mark_imports(_T0)
+        try:
+            asyncio.run(run_polling())
+        except KeyboardInterrupt:
+            pass
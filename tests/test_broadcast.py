@@ -0,0 +1,95 @@
+# tests/test_broadcast.py
+import asyncio
+import time
+
+import pytest
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from app.utils import broadcast
+from app.utils.broadcast import (
+    REFRESH_SCRIPT, BroadcastUnavailable, Broadcaster, LockLost, _key, _lock_key,
+)
+from app.utils.rate_limit import TokenBucket
+from app.utils.redis_manager import RedisManager
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.hashes = {}
+
+    async def eval(self, script, numkeys, key, token, *args):
+        if self.data.get(key) != token.encode():
+            return 0
+        if script == REFRESH_SCRIPT:
+            return 1
+        del self.data[key]
+        return 1
+
+    def pipeline(self, transaction=True):
+        raise AssertionError("checkpoint written without the lock")
+
+
+class StubBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append(chat_id)
+
+
+def test_commands_without_redis(monkeypatch):
+    monkeypatch.setattr(RedisManager, "_client", None)
+    b = Broadcaster()
+
+    async def main():
+        for call in (b.status(), b.cancel(), b.start(StubBot(), "greeting", 1)):
+            with pytest.raises(BroadcastUnavailable):
+                await call
+
+    asyncio.run(main())
+
+
+def test_checkpoint_not_moved_after_lock_taken_over():
+    redis = FakeRedis()
+    redis.data[_lock_key("b1")] = b"other-instance"
+    b = Broadcaster()
+    b._bot = StubBot()
+
+    async def main():
+        with pytest.raises(LockLost):
+            await b._send_chunk(redis, "b1", "greeting", [(1, 100, "en")], TokenBucket(rate=1000, capacity=10))
+        assert _key("b1") not in redis.hashes
+
+    asyncio.run(main())
+
+
+class FlakyRedis:
+    # the first `failures` EVALs time out, then the lock refresh goes through
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    async def eval(self, script, numkeys, key, token, *args):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RedisTimeoutError("timed out")
+        return 1
+
+
+def test_lock_refresh_retries_redis_errors(monkeypatch):
+    monkeypatch.setattr(broadcast, "RETRY_DELAY", 0.01)
+    b = Broadcaster()
+    b._lock_expires = time.monotonic() + 5
+    redis = FlakyRedis(failures=2)
+    asyncio.run(b._refresh_lock(redis, "b1"))
+    assert redis.calls == 3
+
+
+def test_lock_refresh_gives_up_once_the_lock_expired(monkeypatch):
+    monkeypatch.setattr(broadcast, "RETRY_DELAY", 0.01)
+    b = Broadcaster()
+    b._lock_expires = time.monotonic() + 0.05
+    with pytest.raises(LockLost) as exc:
+        asyncio.run(b._refresh_lock(FlakyRedis(failures=1000), "b1"))
+    assert isinstance(exc.value.error, RedisTimeoutError)
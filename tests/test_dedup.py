@@ -0,0 +1,73 @@
+# tests/test_dedup.py
+import asyncio
+
+import pytest
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import Update
+
+from app.middlewares.dedup_middleware import DEDUP_KEY, DONE, UpdateDedupMiddleware
+from app.utils.redis_manager import RedisManager
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token):
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(RedisManager, "_client", fake)
+    return fake
+
+
+def test_duplicate_dropped_after_success(redis):
+    calls = []
+
+    async def handler(event, data):
+        calls.append(event.update_id)
+        return "ok"
+
+    async def run():
+        first, second = UpdateDedupMiddleware(), UpdateDedupMiddleware()
+        update = Update(update_id=1)
+        return await first(handler, update, {}), await first(handler, update, {}), await second(handler, update, {})
+
+    assert asyncio.run(run()) == ("ok", UNHANDLED, UNHANDLED)
+    assert calls == [1]
+    assert redis.data[DEDUP_KEY.format(1)] == DONE
+
+
+@pytest.mark.parametrize("error", [RuntimeError, asyncio.CancelledError])
+def test_claim_released_when_handler_fails(redis, error):
+    attempts = []
+
+    async def handler(event, data):
+        attempts.append(event.update_id)
+        if len(attempts) == 1:
+            raise error()
+        return "ok"
+
+    async def run():
+        mw = UpdateDedupMiddleware()
+        update = Update(update_id=2)
+        with pytest.raises(error):
+            await mw(handler, update, {})
+        assert DEDUP_KEY.format(2) not in redis.data
+        # the redelivered copy runs
+        return await mw(handler, update, {})
+
+    assert asyncio.run(run()) == "ok"
+    assert attempts == [2, 2]
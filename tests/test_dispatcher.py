@@ -0,0 +1,51 @@
+# tests/test_dispatcher.py
+import asyncio
+import time
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Update
+
+from app.bot.dispatcher import create_dispatcher
+from app.core.metrics import DB_STATEMENTS_PER_UPDATE
+from app.db.instrumentation import profiler
+
+
+class StubSession(BaseSession):
+    async def make_request(self, bot, method, timeout=None):
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        raise RuntimeError("StubSession does not download files")
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def _samples() -> float:
+    for metric in DB_STATEMENTS_PER_UPDATE.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_count"):
+                return sample.value
+    return 0.0
+
+
+def test_update_runs_through_full_middleware_stack():
+    # no handler matches plain text, so the update exercises only the outer middlewares
+    # (dedup, metrics, request id, DB session with the SQL profiler, chat logger)
+    assert profiler is not None
+    dp = create_dispatcher()
+    bot = Bot(token="123456:TEST-TOKEN", session=StubSession())
+    update = Update.model_validate({
+        "update_id": int(time.time() * 1000),
+        "message": {
+            "message_id": 1, "date": int(time.time()), "text": "hello",
+            "chat": {"id": 42, "type": "private"}, "from": {"id": 42, "is_bot": False, "first_name": "t"},
+        },
+    }, context={"bot": bot})
+    before = _samples()
+
+    asyncio.run(dp.feed_update(bot, update))
+
+    assert _samples() == before + 1
@@ -0,0 +1,42 @@
+# tests/test_fsm_storage.py
+import asyncio
+
+import orjson
+from aiogram.fsm.storage.base import StorageKey
+
+from app.middlewares.fsm_prefetch_middleware import FSMPrefetchMiddleware
+from app.utils.fsm_storage import RedisFSMStorage
+from app.utils.redis_manager import RedisManager
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def mget(self, *keys):
+        return [self.data.get(k) for k in keys]
+
+    async def get(self, key):
+        return self.data.get(key)
+
+
+def test_prefetch_does_not_outlive_the_update(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(RedisManager, "_client", redis)
+    storage = RedisFSMStorage()
+    data_key = storage.key_builder.build(KEY, "data")
+
+    async def first_update(event, data):
+        await storage.get_state(KEY)
+
+    async def main():
+        redis.data[data_key] = orjson.dumps({"step": 1})
+        # same task, same context: what ChatScheduler does for a chat's consecutive updates
+        await FSMPrefetchMiddleware()(first_update, None, {})
+        # meanwhile another instance moved the chat on
+        redis.data[data_key] = orjson.dumps({"step": 2})
+        return await storage.get_data(KEY)
+
+    assert asyncio.run(main()) == {"step": 2}
@@ -0,0 +1,66 @@
+# tests/test_lazy_session.py
+import asyncio
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from app.db.lazy_session import LazySessionProxy
+from app.db.models import User
+
+
+class StubSession:
+    def __init__(self, error=None):
+        self.error = error
+        self.info = {}
+        self.executed = 0
+
+    async def connection(self):
+        pass
+
+    async def execute(self, statement, *args, **kwargs):
+        self.executed += 1
+        if self.error is not None:
+            raise self.error
+        return "result"
+
+    async def close(self):
+        pass
+
+
+class StubReplica:
+    def __init__(self, session):
+        self.session = session
+        self.failed = False
+
+    def maker(self):
+        return self.session
+
+    def mark_failed(self):
+        self.failed = True
+
+
+class StubReplicaSet:
+    def __init__(self, replica):
+        self.replica = replica
+
+    def pick(self):
+        return self.replica
+
+
+def _read(replica_error):
+    primary = StubSession()
+    replica = StubReplica(StubSession(error=replica_error))
+    proxy = LazySessionProxy(session_maker=lambda: primary, replicas=StubReplicaSet(replica))
+    result = asyncio.run(proxy.execute(select(User.id)))
+    return result, replica, primary
+
+
+def test_unavailable_replica_falls_back_to_primary():
+    result, replica, primary = _read(OperationalError("SELECT", {}, ConnectionResetError()))
+    assert result == "result" and replica.failed and primary.executed == 1
+
+
+def test_query_error_on_replica_is_raised():
+    with pytest.raises(ProgrammingError):
+        _read(ProgrammingError("SELECT", {}, Exception("column does not exist")))
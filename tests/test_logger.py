@@ -0,0 +1,38 @@
+# tests/test_logger.py
+import io
+import logging
+import queue
+import threading
+
+import orjson
+
+from app.core.logger import DroppingQueueHandler, QueueLogWriter
+
+
+def test_full_stdlib_queue_counts_drops():
+    writer = QueueLogWriter(io.BytesIO(), maxsize=10)
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1), writer)
+    record = logging.LogRecord("aiohttp", logging.WARNING, __file__, 1, "msg", None, None)
+    for _ in range(3):
+        handler.handle(record)
+    assert writer._take_dropped() == 2
+    writer.close()
+
+
+def test_drops_from_threads_are_all_reported():
+    stream = io.BytesIO()
+    writer = QueueLogWriter(stream, maxsize=10)
+
+    def bump():
+        for _ in range(10_000):
+            writer.drop()
+
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    writer.close()
+    reported = sum(orjson.loads(line)["count"] for line in stream.getvalue().splitlines()
+                   if orjson.loads(line)["event"] == "log_dropped")
+    assert reported == 40_000
@@ -0,0 +1,39 @@
+# tests/test_metrics.py
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import app.db.instrumentation  # noqa: F401  registers /debug/sql
+from app.core.config import conf
+from app.core.metrics import DEBUG_TOKEN_HEADER, add_metrics_route
+
+
+def _request(public: bool, method: str, path: str, headers=None) -> int:
+    async def main():
+        web_app = web.Application()
+        add_metrics_route(web_app, public=public)
+        async with TestClient(TestServer(web_app)) as client:
+            resp = await client.request(method, path, headers=headers)
+            return resp.status
+
+    return asyncio.run(main())
+
+
+def test_debug_routes_not_on_public_app_without_token(monkeypatch):
+    monkeypatch.setattr(conf.metrics, "debug_token", "")
+    assert _request(True, "GET", conf.metrics.path) == 200
+    assert _request(True, "GET", "/debug/sql") == 404
+    assert _request(False, "GET", "/debug/sql") == 200
+
+
+def test_debug_routes_need_token(monkeypatch):
+    monkeypatch.setattr(conf.metrics, "debug_token", "s3cret")
+    assert _request(True, "GET", "/debug/sql") == 401
+    assert _request(True, "GET", "/debug/sql", {DEBUG_TOKEN_HEADER: "s3cret"}) == 200
+
+
+def test_reset_is_post_only(monkeypatch):
+    monkeypatch.setattr(conf.metrics, "debug_token", "")
+    assert _request(False, "GET", "/debug/sql/reset") == 405
+    assert _request(False, "POST", "/debug/sql/reset") == 200
@@ -0,0 +1,84 @@
+# tests/test_polling.py
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.types import Update
+
+from app.utils.polling import Poller
+
+
+class FakeTelegram:
+    # getUpdates as Telegram runs it: an offset confirms (deletes) every update below it
+    def __init__(self, update_ids):
+        self.pending = [Update(update_id=i) for i in update_ids]
+        self.id = 1
+        self.session = SimpleNamespace(timeout=1)
+        self.offsets = []
+
+    async def __call__(self, method, request_timeout=None):
+        self.offsets.append(method.offset)
+        if method.offset is not None:
+            self.pending = [u for u in self.pending if u.update_id >= method.offset]
+        if not self.pending:
+            await asyncio.sleep(0.01)
+        return self.pending[:method.limit]
+
+
+class SlowDispatcher:
+    def resolve_used_update_types(self):
+        return []
+
+    async def feed_update(self, bot, update):
+        await asyncio.sleep(0 if update.update_id == 1 else 10)
+
+
+class TaskScheduler:
+    def __init__(self):
+        self.tasks = []
+
+    async def submit(self, key, job):
+        self.tasks.append(asyncio.create_task(job()))
+
+
+def test_cancelled_update_is_not_confirmed_to_telegram():
+    async def run():
+        telegram = FakeTelegram([1, 2])
+        scheduler = TaskScheduler()
+        poller = Poller(telegram, SlowDispatcher(), scheduler, offset=None)
+        polling = asyncio.create_task(poller.run())
+        await asyncio.sleep(0.05)
+        polling.cancel()
+        # drain deadline: the slow update is cancelled
+        for task in scheduler.tasks:
+            task.cancel()
+        await asyncio.gather(polling, *scheduler.tasks, return_exceptions=True)
+        return telegram, poller
+
+    telegram, poller = asyncio.run(run())
+    assert max(o for o in telegram.offsets if o is not None) == 2
+    assert [u.update_id for u in telegram.pending] == [2]
+    assert poller.committed == 2
+
+
+class BlockedScheduler:
+    # a full scheduler: submit() waits for a slot that never frees up
+    async def submit(self, key, job):
+        await asyncio.Event().wait()
+
+
+def test_buffered_updates_come_back_after_stop():
+    async def run():
+        telegram = FakeTelegram([1, 2, 3])
+        poller = Poller(telegram, SlowDispatcher(), BlockedScheduler(), offset=None)
+        polling = asyncio.create_task(poller.run())
+        await asyncio.sleep(0.05)
+        poller.stop()
+        await asyncio.sleep(0)
+        assert poller._fetcher.done()
+        polling.cancel()
+        await asyncio.gather(polling, return_exceptions=True)
+
+        # the next process starts from the saved offset and gets all of them again
+        return await telegram(SimpleNamespace(offset=poller.committed, limit=100))
+
+    assert [u.update_id for u in asyncio.run(run())] == [1, 2, 3]
@@ -0,0 +1,70 @@
+# tests/test_profile_writer.py
+import asyncio
+
+import pytest
+
+from app.utils import profile_writer
+from app.utils.profile_writer import ProfileWriteBuffer
+
+
+class StubSession:
+    def __init__(self, fail: bool):
+        self.fail = fail
+        self.statements = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        self.statements += 1
+
+    async def commit(self):
+        if self.fail:
+            raise RuntimeError("db down")
+
+
+def test_on_flushed_runs_only_after_commit(monkeypatch):
+    session = StubSession(fail=True)
+    monkeypatch.setattr(profile_writer, "AsyncSessionLocal", lambda: session)
+    flushed = []
+
+    async def on_flushed():
+        flushed.append(1)
+
+    async def main():
+        buffer = ProfileWriteBuffer(max_size=100, interval=60)
+        buffer.add(1, "alice", "Alice", False, on_flushed=on_flushed)
+        with pytest.raises(RuntimeError):
+            await buffer.flush()
+        assert flushed == [] and len(buffer) == 1
+
+        session.fail = False
+        assert await buffer.flush() == 1
+        assert flushed == [1] and len(buffer) == 0
+
+    asyncio.run(main())
+
+
+def test_failed_rows_dropped_after_max_retries(monkeypatch):
+    monkeypatch.setattr(profile_writer, "AsyncSessionLocal", lambda: StubSession(fail=True))
+
+    async def main():
+        buffer = ProfileWriteBuffer(max_size=100, interval=60, max_retries=2)
+        buffer.add(1, "alice", "Alice", False)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await buffer.flush()
+        assert len(buffer) == 0
+
+    asyncio.run(main())
+
+
+def test_adds_dropped_when_full():
+    buffer = ProfileWriteBuffer(max_size=100, interval=60, max_pending=2)
+    for cid in (1, 2, 3):
+        buffer.add(cid, None, None, None)
+    buffer.add(1, "alice", None, None)
+    assert len(buffer) == 2 and buffer._pending[1][0] == "alice"
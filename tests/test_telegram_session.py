@@ -0,0 +1,49 @@
+# tests/test_telegram_session.py
+import asyncio
+import time
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetMe, SendMessage
+
+from app.utils.telegram_session import RateLimitedSession
+
+
+def _flood_once(monkeypatch, retry_after: float):
+    calls = []
+
+    async def make_request(self, bot, method, timeout=None):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=retry_after)
+        return True
+
+    monkeypatch.setattr(AiohttpSession, "make_request", make_request)
+    return calls
+
+
+def test_chat_flood_limit_pauses_only_that_chat(monkeypatch):
+    calls = _flood_once(monkeypatch, retry_after=1)
+
+    async def main():
+        session = RateLimitedSession()
+        started = time.monotonic()
+        result = await session.make_request(None, SendMessage(chat_id=42, text="hi"))
+        return session, result, time.monotonic() - started
+
+    session, result, elapsed = asyncio.run(main())
+    assert result is True and len(calls) == 2
+    assert elapsed >= 0.9
+    assert session.global_limiter._paused_until < time.monotonic()
+
+
+def test_flood_limit_without_chat_pauses_everything(monkeypatch):
+    _flood_once(monkeypatch, retry_after=1)
+
+    async def main():
+        session = RateLimitedSession()
+        await session.make_request(None, GetMe())
+        return session
+
+    session = asyncio.run(main())
+    assert session.global_limiter._paused_until > 0
@@ -0,0 +1,27 @@
+# tests/test_webhook.py
+import asyncio
+
+from app.core.config import conf
+from app.utils import run_webhook
+from app.utils.run_webhook import create_app
+
+
+def _paths(app):
+    return {r.resource.canonical for r in app.router.routes()}
+
+
+def test_workers_serve_metrics_on_their_own_port(monkeypatch):
+    # the routers are module-level and can join one dispatcher per process
+    monkeypatch.setattr(run_webhook, "create_dispatcher", object)
+
+    async def main():
+        single = await create_app(register=False)
+        worker = await create_app(register=False, metrics_port=conf.metrics.port + 1)
+        for app in (single, worker):
+            await app["bot"].session.close()
+        return _paths(single), _paths(worker)
+
+    single, worker = asyncio.run(main())
+    assert conf.metrics.path in single
+    assert conf.metrics.path not in worker
+    assert conf.webhook.path() in worker